@@ -0,0 +1,141 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+
+from database import GameDatabase
+from levelgen import generate_level
+from simulation import Simulation, BOTS
+from telemetry import RunTelemetry
+
+BATCH_DB = "batch_results.db"
+# level_results.level of generated levels, which have no number of their own.
+GENERATED_LEVEL = 0
+BATCH_SIZE = 200
+
+
+def episodes(bots, levels, generated, count, seed, ticks, platforms):
+    # One spec per episode: (bot, level number, generated level seed or
+    # None, bot seed, tick limit, generated level platforms).
+    maps = [(level_num, None) for level_num in levels]
+    maps += [(GENERATED_LEVEL, seed + i) for i in range(generated)]
+    seeds = itertools.count(seed)
+    for bot, (level_num, level_seed), _ in itertools.product(bots, maps, range(count)):
+        yield bot, level_num, level_seed, next(seeds), ticks, platforms
+
+
+def run_episode(spec):
+    # Runs in a worker process. The result dict goes back to the parent
+    # through a pipe, so it only holds plain values and the run's events
+    # (a RunTelemetry, whose arrays pickle cheaply).
+    bot_name, level_num, level_seed, seed, max_ticks, platforms = spec
+    level = None
+    if level_seed is not None:
+        level = generate_level(level_seed, platforms=platforms)
+    world = Simulation(level_num, level)
+    bot = BOTS[bot_name](seed)
+    telemetry = RunTelemetry()
+
+    start = time.perf_counter()
+    while world.state == "playing" and world.ticks < max_ticks:
+        bot.act(world)
+        telemetry.record_events(world.step(), world.ticks)
+    elapsed = time.perf_counter() - start
+
+    completed = world.state == "level_complete"
+    return {
+        'bot': bot_name,
+        'level': level_num,
+        'level_seed': level_seed,
+        'seed': seed,
+        'state': world.state,
+        'completed': completed,
+        'score': world.player.score,
+        'rubles': world.player.rubless,
+        'pmcs_defeated': world.pmcs_defeated,
+        'completion_time': world.elapsed_time if completed else None,
+        'ticks': world.ticks,
+        'ticks_per_sec': world.ticks / max(elapsed, 1e-9),
+        'events': telemetry,
+    }
+
+
+def result_operation(result):
+    # The level_results row for one episode, as a GameDatabase.run_batch
+    # operation. Bots are stored as players named "bot:<name>".
+    return ('save_level_result',
+            (f"bot:{result['bot']}", result['level'], result['rubles'], result['pmcs_defeated'],
+             result['completion_time'], result['score']),
+            {'completed': result['completed'], 'events': result['events']})
+
+
+def play_batch(specs, db, workers=None, batch_size=BATCH_SIZE, on_result=None):
+    # Plays the episodes on a process pool and writes the results to db as
+    # they arrive, one transaction per batch_size episodes. Returns the
+    # number of episodes played.
+    played = 0
+    pending = []
+    with multiprocessing.Pool(workers) as pool:
+        for result in pool.imap_unordered(run_episode, specs, chunksize=4):
+            played += 1
+            pending.append(result_operation(result))
+            if on_result is not None:
+                on_result(result)
+            if len(pending) >= batch_size:
+                db.run_batch(pending)
+                pending = []
+    if pending:
+        db.run_batch(pending)
+    return played
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many headless episodes with bots on all cores")
+    parser.add_argument("--bots", nargs="+", choices=sorted(BOTS), default=["random", "runner"])
+    parser.add_argument("--levels", nargs="*", type=int, default=[1, 2, 3])
+    parser.add_argument("--generated", type=int, default=0,
+                        help="number of generated levels, seeded from --seed")
+    parser.add_argument("--platforms", type=int, default=200, help="platforms per generated level")
+    parser.add_argument("--episodes", type=int, default=10, help="episodes per bot and level")
+    parser.add_argument("--ticks", type=int, default=20000, help="tick limit per episode")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--db", default=BATCH_DB)
+    parser.add_argument("--jsonl", help="also append every result to this file as a JSON line")
+    parser.add_argument("--quiet", action="store_true", help="only print the summary")
+    args = parser.parse_args()
+
+    specs = list(episodes(args.bots, args.levels, args.generated, args.episodes,
+                          args.seed, args.ticks, args.platforms))
+    jsonl = open(args.jsonl, 'a', encoding='utf-8') if args.jsonl else None
+    totals = {'ticks': 0, 'completed': 0}
+
+    def report(result):
+        totals['ticks'] += result['ticks']
+        totals['completed'] += result['completed']
+        if jsonl is not None:
+            jsonl.write(json.dumps({key: value for key, value in result.items() if key != 'events'}) + "\n")
+        if not args.quiet:
+            level = result['level'] if result['level_seed'] is None else f"gen{result['level_seed']}"
+            print(f"{result['bot']:>6} level {level} seed {result['seed']}: {result['state']}, "
+                  f"score {result['score']}, rubles {result['rubles']}, PMCs {result['pmcs_defeated']}, "
+                  f"{result['ticks']} ticks, {result['ticks_per_sec']:.0f} ticks/sec", flush=True)
+
+    start = time.perf_counter()
+    try:
+        with GameDatabase(args.db) as db:
+            played = play_batch(specs, db, args.workers, args.batch_size, report)
+    finally:
+        if jsonl is not None:
+            jsonl.close()
+    elapsed = time.perf_counter() - start
+    print(f"{played} episodes ({totals['completed']} completed) in {elapsed:.1f} s on "
+          f"{args.workers} workers: {played / elapsed:.1f} episodes/sec, "
+          f"{totals['ticks'] / elapsed:.0f} ticks/sec, results in {args.db}")
+
+
+if __name__ == "__main__":
+    main()
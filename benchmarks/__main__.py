@@ -0,0 +1,42 @@
+import argparse
+import os
+import sys
+
+# The draw benchmarks run offscreen; this has to be set before arcade loads.
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+
+from benchmarks import harness
+from benchmarks.cases import run_all
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Bugilla! benchmark suite")
+    parser.add_argument("--output", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown counted as a regression (default 0.2 = 20%%)")
+    parser.add_argument("--only", nargs="+", help="run only benchmarks whose name contains one of these")
+    parser.add_argument("--quick", action="store_true", help="fewer repeats and smaller sweeps")
+    parser.add_argument("--no-window", action="store_true", help="skip setup_level, on_update and draw")
+    parser.add_argument("--replays", nargs="+", default=[], metavar="FILE",
+                        help="recorded runs (main.py --record) to time as replay.<name>")
+    args = parser.parse_args()
+
+    recorder = harness.Recorder(quick=args.quick, only=args.only)
+    run_all(recorder, with_window=not args.no_window, replays=args.replays)
+    document = recorder.document()
+    harness.save(document, args.output)
+    print(f"\nwrote {len(recorder.results)} results to {args.output}")
+
+    if args.compare:
+        print()
+        regressions = harness.compare(document, harness.load(args.compare), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold * 100:.0f}%")
+            sys.exit(1)
+        print("\nno regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks import baseline_database
+from database import GameDatabase
+
+
+class UncachedGameDatabase(GameDatabase):
+    # Persistent connection, but every read goes to SQLite.
+    def _cached(self, cache, key, loader):
+        with self.lock:
+            self.cache_misses += 1
+            return loader(key)
+
+
+class BaselineDatabase(baseline_database.GameDatabase):
+    # The original code: a fresh connection with default pragmas (rollback
+    # journal, synchronous=FULL) for every call, no indexes, no caches. It
+    # keeps no connection, so there is nothing to close.
+    def close(self):
+        pass
+
+
+OPERATIONS = [
+    ('save_game', lambda db, i: db.save_game(f"player{i % 10}", 1 + i % 3, i, i * 10, 3)),
+    ('load_game', lambda db, i: db.load_game(f"player{i % 10}")),
+    ('save_level_result', lambda db, i: db.save_level_result(f"player{i % 10}", 1 + i % 3, 5, 2, 30.0, 150)),
+    ('get_level_stats', lambda db, i: db.get_level_stats(1 + i % 3)),
+    ('get_high_scores', lambda db, i: db.get_high_scores(10)),
+]
+
+
+def measure(db_class, path, ops):
+    db = db_class(path)
+    results = {}
+    try:
+        for name, operation in OPERATIONS:
+            start = time.perf_counter()
+            for i in range(ops):
+                operation(db, i)
+            elapsed = time.perf_counter() - start
+            results[name] = ops / elapsed
+    finally:
+        db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GameDatabase ops/sec before and after connection reuse and caching")
+    parser.add_argument("--ops", type=int, default=500, help="calls per operation")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before = measure(BaselineDatabase, os.path.join(tmp, "before.db"), args.ops)
+        uncached = measure(UncachedGameDatabase, os.path.join(tmp, "uncached.db"), args.ops)
+        after = measure(GameDatabase, os.path.join(tmp, "after.db"), args.ops)
+
+    print(f"{'operation':<20}{'before ops/s':>15}{'no cache ops/s':>16}{'after ops/s':>15}{'speedup':>10}")
+    for name, _ in OPERATIONS:
+        print(f"{name:<20}{before[name]:>15.0f}{uncached[name]:>16.0f}{after[name]:>15.0f}"
+              f"{after[name] / before[name]:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import random
+import time
+
+import arcade
+
+from collisions import EnemyGrid
+from enemies import EnemyEngine, PATROL, BOB, CHASE
+from sprites import PMC
+
+
+def make_pmcs(count, seed=0):
+    # Held in a SpriteList the way Simulation holds them, so moving a sprite
+    # also pays for the list's buffers.
+    rng = random.Random(seed)
+    pmcs = arcade.SpriteList(lazy=True)
+    for _ in range(count):
+        left = rng.uniform(0, 10000)
+        right = left + rng.uniform(50, 300)
+        pmcs.append(PMC(rng.uniform(left, right), rng.uniform(0, 2000), left, right))
+    return pmcs
+
+
+def python_step(pmcs):
+    # The per-sprite loop GameWindow.on_update used before EnemyEngine.
+    for pmc in pmcs:
+        pmc.center_x += pmc.change_x
+
+        if pmc.center_x <= pmc.left_bound:
+            pmc.change_x = abs(pmc.change_x)
+        elif pmc.center_x >= pmc.right_bound:
+            pmc.change_x = -abs(pmc.change_x)
+
+
+def game_tick(engine, grid):
+    # What Simulation.step and the culled draw sync now: the collision
+    # candidates around a player in the middle of the level, and the PMCs
+    # near a 1280x720 view around it.
+    engine.step(5000.0)
+    engine.sync_sprites(grid.near(4980, 980, 5020, 1020))
+    engine.sync_sprites(grid.near(4360, 640, 5640, 1360), 0.5)
+
+
+def per_tick(function, ticks):
+    start = time.perf_counter()
+    for _ in range(ticks):
+        function()
+    return (time.perf_counter() - start) / ticks * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PMC movement cost per tick as enemy count grows")
+    parser.add_argument("--counts", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument("--ticks", type=int, default=20)
+    args = parser.parse_args()
+
+    behaviors = (PATROL, BOB, CHASE)
+    print(f"{'enemies':>8}{'python ms':>12}{'step ms':>10}{'sync all ms':>13}{'tick ms':>10}{'mixed ms':>10}")
+    for count in args.counts:
+        pmcs = make_pmcs(count)
+        python_ms = per_tick(lambda: python_step(pmcs), args.ticks)
+
+        pmcs = make_pmcs(count)
+        engine = EnemyEngine(count)
+        for pmc in pmcs:
+            engine.add(pmc, pmc.left_bound, pmc.right_bound)
+        step_ms = per_tick(engine.step, args.ticks)
+        sync_ms = per_tick(lambda: engine.sync_sprites(engine.sprites), args.ticks)
+        grid = EnemyGrid(engine)
+        grid.update()
+        tick_ms = per_tick(lambda: game_tick(engine, grid), args.ticks)
+
+        mixed = EnemyEngine(count)
+        for i, pmc in enumerate(make_pmcs(count)):
+            mixed.add(pmc, pmc.left_bound, pmc.right_bound, behavior=behaviors[i % 3])
+        mixed_ms = per_tick(lambda: mixed.step(5000.0), args.ticks)
+
+        print(f"{count:>8}{python_ms:>12.3f}{step_ms:>10.3f}{sync_ms:>13.3f}{tick_ms:>10.3f}{mixed_ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
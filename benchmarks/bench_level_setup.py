@@ -0,0 +1,39 @@
+import argparse
+import os
+import time
+
+os.environ.setdefault("ARCADE_HEADLESS", "1")
+
+from game import GameWindow
+from textures import TEXTURES
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GameWindow.setup_level cold versus warm")
+    parser.add_argument("--runs", type=int, default=50, help="warm setups per level")
+    args = parser.parse_args()
+
+    window = GameWindow()
+    try:
+        start = time.perf_counter()
+        window.setup_level(1)
+        cold = time.perf_counter() - start
+        cold_loads = TEXTURES.loads
+
+        warm = {}
+        for level in (1, 2, 3):
+            start = time.perf_counter()
+            for _ in range(args.runs):
+                window.setup_level(level)
+            warm[level] = (time.perf_counter() - start) / args.runs
+
+        print(f"cold setup_level(1): {cold * 1000:8.2f} ms ({cold_loads} textures decoded)")
+        for level, seconds in warm.items():
+            print(f"warm setup_level({level}): {seconds * 1000:8.2f} ms")
+        print(f"textures decoded after warm runs: {TEXTURES.loads}")
+    finally:
+        window.close()
+
+
+if __name__ == "__main__":
+    main()
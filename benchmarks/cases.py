@@ -0,0 +1,421 @@
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from culling import WorldView
+from database import GameDatabase
+from levelgen import generate_level, write_level
+from levels import LevelLoader, CACHE_DIR
+from reachability import LevelGraph
+from replay import Recording, replay_headless, world_digest
+from snapshot import capture, restore
+from telemetry import RunTelemetry, FRAME, heatmap, iter_runs
+from simulation import Simulation
+from textures import TEXTURES
+
+
+def scaled_level(platforms=8, rubless=6, pmcs=3, seed=0):
+    # A level in the Level.get_level schema with the given object counts,
+    # laid out left to right at roughly the density of the shipped levels.
+    rng = random.Random(seed)
+    width = max(platforms, rubless, pmcs) * 100 + 800
+    level = {
+        'name': 'benchmark',
+        'platforms': [(0, 100, 800, 20)],
+        'rubless': [],
+        'pmcs': [],
+        'flag': (width - 50, 342),
+        'player_start': (50, 150),
+        'background_color': (135, 206, 235),
+    }
+    for _ in range(platforms - 1):
+        level['platforms'].append((rng.uniform(0, width), rng.uniform(50, 550), 100, 20))
+    for _ in range(rubless):
+        level['rubless'].append((rng.uniform(0, width), rng.uniform(100, 600)))
+    for _ in range(pmcs):
+        left = rng.uniform(0, width)
+        level['pmcs'].append((left, rng.uniform(100, 500), left, left + 100))
+    return level
+
+
+def endless(sim):
+    # Timed ticks must not stop early because the idle player died.
+    sim.player.lives = 10 ** 9
+    return sim
+
+
+def bench_simulation(recorder):
+    for level_num in (1, 2, 3):
+        state = {}
+        recorder.measure(f"simulation.tick.level{level_num}",
+                         lambda: sim_step(state),
+                         number=600, repeat=5,
+                         setup=lambda n=level_num: state.update(sim=endless(Simulation(n))),
+                         params={'level': level_num})
+
+
+def sim_step(state):
+    state['sim'].step()
+
+
+def bench_collisions(recorder):
+    sim = Simulation(1)
+    player = sim.player
+    recorder.measure("collisions.pmc_hits", lambda: sim.collisions.pmc_hits(player), number=2000)
+    recorder.measure("collisions.rubles_hits", lambda: sim.collisions.rubles_hits(player), number=2000)
+    recorder.measure("collisions.flag_hit", lambda: sim.collisions.flag_hit(player), number=2000)
+
+
+class UnculledView:
+    # Stand-in for culling.WorldView that submits every sprite.
+    def __init__(self, world):
+        self.world = world
+
+    def update(self, left, bottom, right, top, alpha=1.0):
+        enemies = self.world.enemies
+        enemies.sync_sprites(enemies.sprites, alpha)
+
+    def draw(self):
+        world = self.world
+        for sprite_list in (world.platforms, world.rubless, world.pmcs, world.flags, world.players):
+            sprite_list.draw()
+
+
+def bench_window(recorder, window):
+    TEXTURES.textures.clear()
+    start = time.perf_counter()
+    window.setup_level(1)
+    recorder.record("setup_level.cold", (time.perf_counter() - start) * 1000)
+
+    for level_num in (1, 2, 3):
+        recorder.measure(f"setup_level.warm.level{level_num}",
+                         lambda n=level_num: window.setup_level(n), number=10)
+
+    # Level switch stall: building the next level on the spot, and swapping in
+    # one the preloader built while the results screen was up.
+    recorder.measure("transition.sync", lambda: window.setup_level(2), number=1, repeat=10)
+
+    def preload():
+        window.preloader.start(2)
+        window.preloader.thread.join()
+
+    recorder.measure("transition.preloaded",
+                     lambda: window.setup_level(2, window.preloader.take(2)),
+                     number=1, repeat=10, setup=preload)
+
+    def fresh_level():
+        window.setup_level(1)
+        endless(window.world)
+        window.game_state = "playing"
+
+    recorder.measure("window.on_update", lambda: window.on_update(1 / 60),
+                     number=300, setup=fresh_level)
+
+    def draw():
+        window.on_draw()
+        window.ctx.finish()
+
+    fresh_level()
+    recorder.measure("draw.game", draw, number=100)
+    window.game_state = "menu"
+    recorder.measure("draw.menu", draw, number=100)
+    window.game_state = "level_complete"
+    recorder.measure("draw.level_complete", draw, number=100)
+
+    # A 50k-object level loaded whole: the culled pass against drawing every
+    # sprite list.
+    counts = {'platforms': 20000, 'rubless': 20000, 'pmcs': 10000}
+    if recorder.wanted("draw.game.large"):
+        fresh_level()
+        window.world = endless(Simulation(0, scaled_level(**counts)))
+        window.world_view = WorldView(window.world)
+        recorder.measure("draw.game.large.culled", draw, number=20, params=counts)
+
+        window.world_view = UnculledView(window.world)
+        recorder.measure("draw.game.large.unculled", draw, number=20, params=counts)
+
+
+def bench_level_loading(recorder):
+    # A 100k-object level file: cold parse and validation, load from the
+    # compiled cache, and a memoized repeat.
+    if not recorder.wanted("levels.load"):
+        return
+    counts = {'platforms': 34000, 'rubless': 33000, 'pmcs': 33000}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "huge.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(scaled_level(**counts), f)
+        params = dict(counts, bytes=os.path.getsize(path))
+
+        def drop_cache():
+            shutil.rmtree(os.path.join(tmp, CACHE_DIR), ignore_errors=True)
+
+        recorder.measure("levels.load.parse", lambda: LevelLoader().load(path),
+                         repeat=3, setup=drop_cache, params=params)
+        recorder.measure("levels.load.cache", lambda: LevelLoader().load(path),
+                         repeat=5, params=params)
+        loader = LevelLoader()
+        loader.load(path)
+        recorder.measure("levels.load.memo", lambda: loader.load(path),
+                         number=1000, params=params)
+
+
+def bench_streaming(recorder):
+    # A level far wider than the screen: full setup against streamed setup,
+    # and ticks while the view walks across it.
+    if not recorder.wanted("streaming"):
+        return
+    counts = {'platforms': 20000, 'rubless': 20000, 'pmcs': 10000}
+    level = scaled_level(**counts)
+
+    start = time.perf_counter()
+    Simulation(0, level)
+    recorder.record("streaming.setup.full", (time.perf_counter() - start) * 1000, counts)
+
+    start = time.perf_counter()
+    sim = endless(Simulation(0, level, streaming=True))
+    recorder.record("streaming.setup.streamed", (time.perf_counter() - start) * 1000, counts)
+
+    ticks = iter(range(10 ** 9))
+
+    def walk():
+        sim.view_center = (50 + next(ticks) * 20, 300)
+        sim.step()
+
+    try:
+        recorder.measure("streaming.tick.walk", walk, number=500, repeat=3,
+                         params=dict(counts, step=20))
+    finally:
+        sim.close()
+
+
+def bench_generator(recorder):
+    # Generating levels in memory and streamed to disk, and ticks on a
+    # generated level played through the streamer.
+    if not recorder.wanted("levelgen"):
+        return
+    for platforms in (10000, 100000):
+        recorder.measure(f"levelgen.generate.{platforms}", lambda: generate_level(0, platforms=platforms),
+                         number=1, repeat=3, params={'platforms': platforms})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "generated.json")
+        recorder.measure("levelgen.write.100000", lambda: write_level(path, 0, platforms=100000),
+                         number=1, repeat=3, params={'platforms': 100000})
+
+    level = generate_level(0, platforms=20000)
+    sim = endless(Simulation(0, level, streaming=True))
+    ticks = iter(range(10 ** 9))
+
+    def walk():
+        sim.view_center = (50 + next(ticks) * 20, 300)
+        sim.step()
+
+    try:
+        recorder.measure("levelgen.tick.walk", walk, number=500, repeat=3,
+                         params={'platforms': 20000, 'step': 20})
+    finally:
+        sim.close()
+
+
+def bench_reachability(recorder):
+    # Building the jump graph and checking every rubles item and the flag
+    # on generated levels.
+    if not recorder.wanted("reachability"):
+        return
+    for platforms in (10000, 100000):
+        level = generate_level(0, platforms=platforms)
+        params = {'platforms': platforms, 'rubless': len(level['rubless'])}
+        recorder.measure(f"reachability.graph.{platforms}", lambda: LevelGraph(level),
+                         number=1, repeat=3, params=params)
+        recorder.measure(f"reachability.check.{platforms}", lambda: LevelGraph(level).unreachable(),
+                         number=1, repeat=3, params=params)
+
+
+def bench_snapshots(recorder):
+    # Capturing and restoring mid-level state, on a shipped level and on a
+    # large streamed one.
+    if not recorder.wanted("snapshot"):
+        return
+    cases = [("level1", 1, None, False), ("generated", 0, generate_level(0, platforms=5000, pmc_density=1.0), True)]
+    for name, level_num, level, streaming in cases:
+        world = endless(Simulation(level_num, level, streaming=streaming))
+        for _ in range(600):
+            world.step()
+        data = capture(world)
+        params = {'bytes': len(data), 'streaming': streaming}
+        recorder.measure(f"snapshot.capture.{name}", lambda: capture(world), number=200, repeat=5, params=params)
+        fresh = []
+        try:
+            recorder.measure(f"snapshot.restore.{name}", lambda: restore(fresh[-1], data), number=1, repeat=20,
+                             setup=lambda: fresh.append(Simulation(level_num, level, streaming=streaming)),
+                             params=params)
+        finally:
+            for restored in fresh + [world]:
+                restored.close()
+
+
+def fill_database(db, rows, seed=0):
+    rng = random.Random(seed)
+    batch = []
+    for i in range(rows):
+        batch.append(('save_level_result',
+                      (f"player{i % 500}", 1 + i % 3, rng.randint(0, 6), rng.randint(0, 3),
+                       rng.uniform(10, 120), rng.randint(0, 900)),
+                      {}))
+        if len(batch) == 1000:
+            db.run_batch(batch)
+            batch = []
+    if batch:
+        db.run_batch(batch)
+
+
+def bench_database_methods(recorder, db, prefix, params=None):
+    counter = iter(range(10 ** 9))
+    recorder.measure(f"{prefix}.save_game",
+                     lambda: db.save_game(f"player{next(counter) % 50}", 2, 3, 150, 3),
+                     number=200, params=params)
+    recorder.measure(f"{prefix}.save_level_result",
+                     lambda: db.save_level_result(f"player{next(counter) % 50}", 1, 4, 1, 42.0, 140),
+                     number=200, params=params)
+
+    def uncached(cache, function):
+        def run():
+            cache.clear()
+            function()
+        return run
+
+    recorder.measure(f"{prefix}.load_game.cached", lambda: db.load_game("player1"),
+                     number=2000, params=params)
+    recorder.measure(f"{prefix}.load_game.uncached",
+                     uncached(db.save_cache, lambda: db.load_game("player1")),
+                     number=500, params=params)
+    recorder.measure(f"{prefix}.get_level_stats.uncached",
+                     uncached(db.stats_cache, lambda: db.get_level_stats(1)),
+                     number=500, params=params)
+    recorder.measure(f"{prefix}.get_high_scores.uncached",
+                     uncached(db.high_scores_cache, lambda: db.get_high_scores(10)),
+                     number=500, params=params)
+
+
+def bench_database(recorder):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = GameDatabase(os.path.join(tmp, "bench.db"))
+        try:
+            bench_database_methods(recorder, db, "db")
+        finally:
+            db.close()
+
+
+def synthetic_run(rng, frames=3600):
+    # A minute at 60 fps: frame samples along a walk, plus scattered events.
+    run = RunTelemetry()
+    kinds = ("rubles_collected", "pmc_defeated", "death", "respawn")
+    for tick in range(frames):
+        x = tick * 2.0
+        run.frame(tick, x, 150.0, rng.uniform(15, 18))
+        if rng.random() < 0.01:
+            run.record(rng.choice(kinds), tick, x, rng.uniform(100, 400))
+    return run
+
+
+def bench_telemetry(recorder):
+    # Recording and packing one run, and streaming a heatmap over stored runs.
+    if not recorder.wanted("telemetry"):
+        return
+    rng = random.Random(0)
+    frames = RunTelemetry()
+    recorder.measure("telemetry.record.frame", lambda: frames.frame(0, 1.0, 2.0, 16.6),
+                     number=10000, repeat=3)
+    run = synthetic_run(rng)
+    blob = run.to_bytes()
+    params = {'events': len(run), 'bytes': len(blob)}
+    recorder.measure("telemetry.pack", run.to_bytes, number=20, repeat=5, params=params)
+    recorder.measure("telemetry.unpack", lambda: RunTelemetry.from_bytes(blob), number=20, repeat=5, params=params)
+
+    runs = 200 if recorder.quick else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        db = GameDatabase(os.path.join(tmp, "bench.db"))
+        try:
+            for _ in range(runs // 100):
+                db.run_batch([('save_level_result', ("bench", 1, 0, 0, None, 0),
+                               {'completed': False, 'events': synthetic_run(rng)})
+                              for _ in range(100)])
+            recorder.measure("telemetry.heatmap.frame",
+                             lambda: heatmap((run for _, _, run in iter_runs(db, 1)), FRAME),
+                             number=1, repeat=3, params={'runs': runs})
+            recorder.measure("telemetry.heatmap.death",
+                             lambda: heatmap((run for _, _, run in iter_runs(db, 1)), "death"),
+                             number=1, repeat=3, params={'runs': runs})
+        finally:
+            db.close()
+
+
+def bench_sweeps(recorder):
+    sizes = [100, 1000] if recorder.quick else [100, 1000, 10000, 50000]
+    base = {'platforms': 8, 'rubless': 6, 'pmcs': 3}
+    for kind in ('platforms', 'rubless', 'pmcs'):
+        for size in sizes:
+            counts = dict(base, **{kind: size})
+            level = scaled_level(**counts)
+            name = f"sweep.{kind}.{size}"
+            if not recorder.wanted(name):
+                continue
+
+            start = time.perf_counter()
+            sim = endless(Simulation(0, level))
+            recorder.record(f"{name}.build", (time.perf_counter() - start) * 1000, counts)
+            recorder.measure(f"{name}.tick", sim.step, number=200, repeat=3, params=counts)
+
+    row_counts = [1000, 10000] if recorder.quick else [1000, 10000, 100000]
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in row_counts:
+            if not recorder.wanted(f"sweep.db_rows.{rows}"):
+                continue
+            db = GameDatabase(os.path.join(tmp, f"rows{rows}.db"))
+            try:
+                fill_database(db, rows)
+                bench_database_methods(recorder, db, f"sweep.db_rows.{rows}", {'rows': rows})
+            finally:
+                db.close()
+
+
+def bench_replays(recorder, paths):
+    # Real player sessions, replayed headless. A replay that no longer ends
+    # in the recorded state is reported instead of timed.
+    for path in paths:
+        recording = Recording.load(path)
+        name = "replay." + os.path.splitext(os.path.basename(path))[0]
+        if not recorder.wanted(name):
+            continue
+        world = replay_headless(recording)
+        if world_digest(world) != recording.digest:
+            print(f"{name}: replay no longer matches the recording, skipped")
+            continue
+        recorder.measure(name, lambda: replay_headless(recording), repeat=3,
+                         params={'level': recording.level_num, 'ticks': recording.ticks,
+                                 'inputs': len(recording.events)})
+
+
+def run_all(recorder, with_window=True, replays=()):
+    bench_simulation(recorder)
+    bench_collisions(recorder)
+    bench_database(recorder)
+    bench_level_loading(recorder)
+    bench_streaming(recorder)
+    bench_generator(recorder)
+    bench_reachability(recorder)
+    bench_snapshots(recorder)
+    bench_telemetry(recorder)
+    bench_sweeps(recorder)
+    bench_replays(recorder, replays)
+    if with_window:
+        from game import GameWindow
+        window = GameWindow()
+        try:
+            bench_window(recorder, window)
+        finally:
+            window.close()
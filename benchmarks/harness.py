@@ -0,0 +1,112 @@
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+
+
+class Recorder:
+    # Collects timings under dotted names ("db.load_game", "sweep.pmcs.1000")
+    # and turns them into the JSON document written by the suite.
+    def __init__(self, quick=False, only=None):
+        self.quick = quick
+        self.only = only
+        self.results = {}
+
+    def wanted(self, name):
+        return self.only is None or any(part in name for part in self.only)
+
+    def measure(self, name, function, number=1, repeat=5, setup=None, params=None):
+        if not self.wanted(name):
+            return None
+        if self.quick:
+            repeat = max(2, repeat // 2)
+
+        samples = []
+        for _ in range(repeat):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            for _ in range(number):
+                function()
+            samples.append((time.perf_counter() - start) / number * 1000)
+
+        result = {
+            'median_ms': statistics.median(samples),
+            'min_ms': min(samples),
+            'max_ms': max(samples),
+            'repeat': repeat,
+            'number': number,
+            'params': params or {},
+        }
+        self.results[name] = result
+        print(f"{name:<44}{result['median_ms']:>12.4f} ms  (min {result['min_ms']:.4f})", flush=True)
+        return result
+
+    def record(self, name, milliseconds, params=None):
+        # For one-shot timings that cannot be repeated, like a cold load.
+        if not self.wanted(name):
+            return None
+        result = {
+            'median_ms': milliseconds,
+            'min_ms': milliseconds,
+            'max_ms': milliseconds,
+            'repeat': 1,
+            'number': 1,
+            'params': params or {},
+        }
+        self.results[name] = result
+        print(f"{name:<44}{milliseconds:>12.4f} ms", flush=True)
+        return result
+
+    def document(self):
+        import arcade
+        import numpy
+        return {
+            'meta': {
+                'date': datetime.now().isoformat(timespec='seconds'),
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'arcade': arcade.__version__,
+                'numpy': numpy.__version__,
+                'quick': self.quick,
+            },
+            'results': self.results,
+        }
+
+
+def save(document, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(current, baseline, threshold):
+    # Returns the names whose median got slower than baseline by more than
+    # `threshold` (0.2 == 20%), printing a side-by-side table on the way.
+    regressions = []
+    current_results = current['results']
+    baseline_results = baseline['results']
+
+    print(f"{'benchmark':<44}{'baseline ms':>14}{'current ms':>14}{'change':>10}")
+    for name in sorted(current_results):
+        if name not in baseline_results:
+            print(f"{name:<44}{'-':>14}{current_results[name]['median_ms']:>14.4f}{'new':>10}")
+            continue
+        before = baseline_results[name]['median_ms']
+        after = current_results[name]['median_ms']
+        change = (after - before) / before if before > 0 else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<44}{before:>14.4f}{after:>14.4f}{change * 100:>9.1f}%{flag}")
+
+    for name in sorted(set(baseline_results) - set(current_results)):
+        print(f"{name:<44}{baseline_results[name]['median_ms']:>14.4f}{'-':>14}{'missing':>10}")
+    return regressions
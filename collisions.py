@@ -0,0 +1,89 @@
+import arcade
+
+
+CELL_SIZE = 128
+
+
+class EnemyGrid:
+    # Uniform grid over the PMCs. PMCs never leave their patrol bounds, so
+    # each one is bucketed by the box it can ever occupy (EnemyEngine.extent)
+    # instead of its current position: moving enemies cost nothing per tick,
+    # new enemies are inserted as they appear, and the grid is only rebuilt
+    # after the engine compacts its arrays.
+    def __init__(self, enemies, cell_size=CELL_SIZE):
+        self.enemies = enemies
+        self.cell_size = cell_size
+        self.cells = {}
+        self.indexed = 0
+        self.margin = 0.0
+        self.compactions = enemies.compactions
+
+    def rebuild(self):
+        self.cells = {}
+        self.indexed = 0
+        self.margin = 0.0
+        self.compactions = self.enemies.compactions
+        self.update()
+
+    def update(self):
+        enemies = self.enemies
+        if self.compactions != enemies.compactions:
+            self.rebuild()
+            return
+
+        size = self.cell_size
+        cells = self.cells
+        for i in range(self.indexed, enemies.count):
+            left, bottom, right, top = enemies.extent(i)
+            for cx in range(int(left // size), int(right // size) + 1):
+                for cy in range(int(bottom // size), int(top // size) + 1):
+                    cells.setdefault((cx, cy), []).append(i)
+            # Buckets hold centers only, so queries are widened by the
+            # largest half-extent to catch sprites hanging over an edge.
+            sprite = enemies.sprites[i]
+            self.margin = max(self.margin, max(sprite.width, sprite.height) / 2)
+        self.indexed = enemies.count
+
+    def near(self, left, bottom, right, top):
+        self.update()
+        size = self.cell_size
+        margin = self.margin
+        min_x = int((left - margin) // size)
+        max_x = int((right + margin) // size)
+        min_y = int((bottom - margin) // size)
+        max_y = int((top + margin) // size)
+
+        alive = self.enemies.alive
+        sprites = self.enemies.sprites
+        found = set()
+        for cx in range(min_x, max_x + 1):
+            for cy in range(min_y, max_y + 1):
+                for i in self.cells.get((cx, cy), ()):
+                    if alive[i]:
+                        found.add(i)
+        return [sprites[i] for i in sorted(found)]
+
+
+class CollisionWorld:
+    # Collision queries for one level. Platforms, rubles and the flag live in
+    # SpriteLists built with arcade's spatial hash (they never move, and the
+    # hash is only touched when a rubles item is collected); PMCs are looked
+    # up through EnemyGrid.
+    def __init__(self, rubless, flags, enemies, cell_size=CELL_SIZE):
+        self.rubless = rubless
+        self.flags = flags
+        self.enemy_grid = EnemyGrid(enemies, cell_size)
+
+    def update(self):
+        self.enemy_grid.update()
+
+    def pmc_hits(self, sprite):
+        candidates = self.enemy_grid.near(sprite.left, sprite.bottom, sprite.right, sprite.top)
+        self.enemy_grid.enemies.sync_sprites(candidates)
+        return [pmc for pmc in candidates if arcade.check_for_collision(sprite, pmc)]
+
+    def rubles_hits(self, sprite):
+        return arcade.check_for_collision_with_list(sprite, self.rubless)
+
+    def flag_hit(self, sprite):
+        return len(arcade.check_for_collision_with_list(sprite, self.flags)) > 0
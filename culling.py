@@ -0,0 +1,79 @@
+import arcade
+
+
+def visible_bounds(center_x, center_y, zoom, width, height):
+    # World-space (left, bottom, right, top) seen by a camera centered on
+    # (center_x, center_y): at zoom < 1 the camera sees more than the window.
+    half_width = width / 2 / zoom
+    half_height = height / 2 / zoom
+    return (center_x - half_width, center_y - half_height,
+            center_x + half_width, center_y + half_height)
+
+
+class CulledLayer:
+    # Draw list holding only the sprites of one world layer that intersect
+    # the view. query(left, bottom, right, top) returns candidates from a
+    # spatial index; the list is updated by difference, so a still camera
+    # costs no buffer changes. Sprites removed from the world (collected,
+    # defeated, unloaded) drop out of this list on their own.
+    def __init__(self, query):
+        self.query = query
+        self.sprites = arcade.SpriteList()
+
+    def update(self, left, bottom, right, top):
+        visible = [sprite for sprite in self.query(left, bottom, right, top)
+                   if sprite.right >= left and sprite.left <= right
+                   and sprite.top >= bottom and sprite.bottom <= top]
+        keep = set(visible)
+        gone = [sprite for sprite in self.sprites if sprite not in keep]
+        for sprite in gone:
+            self.sprites.remove(sprite)
+        for sprite in visible:
+            if sprite not in self.sprites:
+                self.sprites.append(sprite)
+
+    def draw(self):
+        self.sprites.draw()
+
+
+def spatial_query(sprite_list):
+    def query(left, bottom, right, top):
+        return sprite_list.spatial_hash.get_sprites_near_rect(arcade.LRBT(left, right, bottom, top))
+    return query
+
+
+class WorldView:
+    # The culled draw pass for one Simulation. Platforms, rubles and the flag
+    # come from their SpriteLists' spatial hashes and PMCs from the
+    # collision EnemyGrid, so the work per frame follows what is on screen,
+    # not the size of the level.
+    def __init__(self, world):
+        self.world = world
+        self.alpha = 1.0
+        self.layers = [
+            CulledLayer(spatial_query(world.platforms)),
+            CulledLayer(spatial_query(world.rubless)),
+            CulledLayer(self.near_pmcs),
+            CulledLayer(spatial_query(world.flags)),
+        ]
+
+    def near_pmcs(self, left, bottom, right, top):
+        # PMC sprites only get their engine positions when looked at: the
+        # candidates are placed at the interpolated point before culling.
+        world = self.world
+        sprites = world.collisions.enemy_grid.near(left, bottom, right, top)
+        world.enemies.sync_sprites(sprites, self.alpha)
+        return sprites
+
+    def update(self, left, bottom, right, top, alpha=1.0):
+        self.alpha = alpha
+        for layer in self.layers:
+            layer.update(left, bottom, right, top)
+
+    def draw(self):
+        for layer in self.layers:
+            layer.draw()
+        self.world.players.draw()
+
+    def visible_count(self):
+        return sum(len(layer.sprites) for layer in self.layers)
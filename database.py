@@ -1,117 +1,360 @@
 import sqlite3
 from datetime import datetime
 import threading
+import queue
+
+
+# sqlite3 caches compiled statements per connection keyed by the SQL text,
+# so every query lives in a constant and is always passed as the same string.
+SAVE_GAME_DELETE = "DELETE FROM game_saves WHERE player_name = ?"
+
+SAVE_GAME_INSERT = '''
+    INSERT INTO game_saves (player_name, level, rubless, score, lives, save_date)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+LOAD_GAME_SELECT = '''
+    SELECT level, rubless, score, lives FROM game_saves 
+    WHERE player_name = ? ORDER BY save_date DESC LIMIT 1
+'''
+
+LEVEL_RESULT_INSERT = '''
+    INSERT INTO level_results 
+    (player_name, level, rubles_collected, pmcs_defeated, completion_time, score, completed, play_date)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+HIGH_SCORE_SELECT = '''
+    SELECT total_score, total_rubless, levels_completed 
+    FROM high_scores WHERE player_name = ?
+'''
+
+HIGH_SCORE_UPDATE = '''
+    UPDATE high_scores 
+    SET total_score = ?, total_rubless = ?, levels_completed = ?, record_date = ?
+    WHERE player_name = ?
+'''
+
+HIGH_SCORE_INSERT = '''
+    INSERT INTO high_scores (player_name, total_score, total_rubless, levels_completed, record_date)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+LEVEL_AGGREGATE_UPSERT = '''
+    INSERT INTO level_aggregates 
+    (level, play_count, completed_count, total_rubles, total_time, timed_count)
+    VALUES (?, 1, ?, ?, COALESCE(?, 0), ?)
+    ON CONFLICT (level) DO UPDATE SET
+        play_count = play_count + 1,
+        completed_count = completed_count + excluded.completed_count,
+        total_rubles = total_rubles + excluded.total_rubles,
+        total_time = total_time + excluded.total_time,
+        timed_count = timed_count + excluded.timed_count
+'''
+
+LEVEL_STATS_SELECT = '''
+    SELECT total_rubles, total_time, timed_count, play_count, completed_count 
+    FROM level_aggregates 
+    WHERE level = ?
+'''
+
+HIGH_SCORES_SELECT = '''
+    SELECT player_name, total_score, total_rubless, levels_completed 
+    FROM high_scores 
+    ORDER BY total_score DESC 
+    LIMIT ?
+'''
+
+SNAPSHOT_UPSERT = '''
+    INSERT OR REPLACE INTO snapshots (player_name, level, data, save_date)
+    VALUES (?, ?, ?, ?)
+'''
+
+SNAPSHOT_SELECT = "SELECT level, data FROM snapshots WHERE player_name = ?"
+
+SNAPSHOT_DELETE = "DELETE FROM snapshots WHERE player_name = ?"
+
+RUN_EVENTS_INSERT = '''
+    INSERT INTO run_events (result_id, level, event_count, data)
+    VALUES (?, ?, ?, ?)
+'''
+
+# Keyset paging: each page starts after the last result_id of the previous one.
+RUN_EVENTS_PAGE = '''
+    SELECT result_id, level, data FROM run_events
+    WHERE result_id > ? ORDER BY result_id LIMIT ?
+'''
+
+RUN_EVENTS_LEVEL_PAGE = '''
+    SELECT result_id, level, data FROM run_events
+    WHERE level = ? AND result_id > ? ORDER BY result_id LIMIT ?
+'''
+
+# Schema history. Entry N upgrades a database at PRAGMA user_version N to
+# N + 1; never edit an entry once shipped, append a new one instead.
+SCHEMA_MIGRATIONS = [
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS game_saves (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                player_name TEXT NOT NULL,
+                level INTEGER DEFAULT 1,
+                rubless INTEGER DEFAULT 0,
+                score INTEGER DEFAULT 0,
+                lives INTEGER DEFAULT 3,
+                save_date TIMESTAMP
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS level_results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                player_name TEXT NOT NULL,
+                level INTEGER NOT NULL,
+                rubles_collected INTEGER DEFAULT 0,
+                pmcs_defeated INTEGER DEFAULT 0,
+                completion_time FLOAT,
+                score INTEGER DEFAULT 0,
+                completed BOOLEAN DEFAULT FALSE,
+                play_date TIMESTAMP
+            )
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS high_scores (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                player_name TEXT NOT NULL,
+                total_score INTEGER DEFAULT 0,
+                total_rubless INTEGER DEFAULT 0,
+                levels_completed INTEGER DEFAULT 0,
+                record_date TIMESTAMP
+            )
+        ''',
+    ],
+    [
+        "CREATE INDEX IF NOT EXISTS idx_game_saves_player ON game_saves (player_name, save_date)",
+        "CREATE INDEX IF NOT EXISTS idx_level_results_player ON level_results (player_name)",
+        "CREATE INDEX IF NOT EXISTS idx_level_results_level ON level_results (level)",
+        "CREATE INDEX IF NOT EXISTS idx_high_scores_player ON high_scores (player_name)",
+        "CREATE INDEX IF NOT EXISTS idx_high_scores_total ON high_scores (total_score DESC)",
+        '''
+            CREATE TABLE IF NOT EXISTS level_aggregates (
+                level INTEGER PRIMARY KEY,
+                play_count INTEGER DEFAULT 0,
+                completed_count INTEGER DEFAULT 0,
+                total_rubles INTEGER DEFAULT 0,
+                total_time FLOAT DEFAULT 0,
+                timed_count INTEGER DEFAULT 0
+            )
+        ''',
+        '''
+            INSERT OR REPLACE INTO level_aggregates
+            (level, play_count, completed_count, total_rubles, total_time, timed_count)
+            SELECT
+                level,
+                COUNT(*),
+                SUM(CASE WHEN completed THEN 1 ELSE 0 END),
+                COALESCE(SUM(rubles_collected), 0),
+                COALESCE(SUM(completion_time), 0),
+                COUNT(completion_time)
+            FROM level_results
+            GROUP BY level
+        ''',
+    ],
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS snapshots (
+                player_name TEXT PRIMARY KEY,
+                level INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                save_date TIMESTAMP
+            )
+        ''',
+    ],
+    [
+        '''
+            CREATE TABLE IF NOT EXISTS run_events (
+                result_id INTEGER PRIMARY KEY REFERENCES level_results (id),
+                level INTEGER NOT NULL,
+                event_count INTEGER NOT NULL,
+                data BLOB NOT NULL
+            )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_run_events_level ON run_events (level, result_id)",
+    ],
+]
+
+# Marks "not cached yet", since None is a valid cached answer (no save).
+MISSING = object()
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -8000",
+    "PRAGMA temp_store = MEMORY",
+)
 
 
 class GameDatabase:
     def __init__(self, db_name="game_save.db"):
         self.db_name = db_name
         self.lock = threading.Lock()
+        self.conn = None
+        
+        # Read-through caches, invalidated by the write paths below. Cached
+        # dicts and lists are shared with callers and must not be mutated.
+        self.save_cache = {}
+        self.snapshot_cache = {}
+        self.stats_cache = {}
+        self.high_scores_cache = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
+        self.connect()
         self.init_database()
     
-    def init_database(self):
+    def connect(self):
+        # One long-lived connection shared by every thread; all access goes
+        # through self.lock, so sqlite's own thread check is not needed.
+        self.conn = sqlite3.connect(
+            self.db_name,
+            check_same_thread=False,
+            cached_statements=64
+        )
+        for pragma in PRAGMAS:
+            self.conn.execute(pragma)
+    
+    def close(self):
         with self.lock:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS game_saves (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    player_name TEXT NOT NULL,
-                    level INTEGER DEFAULT 1,
-                    rubless INTEGER DEFAULT 0,
-                    score INTEGER DEFAULT 0,
-                    lives INTEGER DEFAULT 3,
-                    save_date TIMESTAMP
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS level_results (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    player_name TEXT NOT NULL,
-                    level INTEGER NOT NULL,
-                    rubles_collected INTEGER DEFAULT 0,
-                    pmcs_defeated INTEGER DEFAULT 0,
-                    completion_time FLOAT,
-                    score INTEGER DEFAULT 0,
-                    completed BOOLEAN DEFAULT FALSE,
-                    play_date TIMESTAMP
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS high_scores (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    player_name TEXT NOT NULL,
-                    total_score INTEGER DEFAULT 0,
-                    total_rubless INTEGER DEFAULT 0,
-                    levels_completed INTEGER DEFAULT 0,
-                    record_date TIMESTAMP
-                )
-            ''')
-            
-            conn.commit()
-            conn.close()
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def init_database(self):
+        with self.lock, self.conn:
+            self.migrate(self.conn.cursor())
+    
+    def migrate(self, cursor):
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        for target, statements in enumerate(SCHEMA_MIGRATIONS[version:], version + 1):
+            # DDL does not open a transaction implicitly, so each step is
+            # wrapped explicitly and commits together with its version bump.
+            cursor.execute("BEGIN")
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute(f"PRAGMA user_version = {target}")
+            self.conn.commit()
     
     def save_game(self, player_name, level, rubless, score, lives):
+        with self.lock, self.conn:
+            self._save_game(self.conn.cursor(), player_name, level, rubless, score, lives)
+    
+    def _save_game(self, cursor, player_name, level, rubless, score, lives):
+        self.save_cache.pop(player_name, None)
+        cursor.execute(SAVE_GAME_DELETE, (player_name,))
+        
+        cursor.execute(SAVE_GAME_INSERT,
+                       (player_name, level, rubless, score, lives, datetime.now()))
+    
+    def _cached(self, cache, key, loader):
+        # Lock-free fast path: a hit never waits for a writer holding the lock.
+        value = cache.get(key, MISSING)
+        if value is not MISSING:
+            self.cache_hits += 1
+            return value
+        
         with self.lock:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            
-            cursor.execute("DELETE FROM game_saves WHERE player_name = ?", (player_name,))
-            
-            cursor.execute('''
-                INSERT INTO game_saves (player_name, level, rubless, score, lives, save_date)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (player_name, level, rubless, score, lives, datetime.now()))
-            
-            conn.commit()
-            conn.close()
+            value = cache.get(key, MISSING)
+            if value is MISSING:
+                self.cache_misses += 1
+                value = loader(key)
+                cache[key] = value
+            else:
+                self.cache_hits += 1
+            return value
+    
+    def cache_stats(self):
+        return {'hits': self.cache_hits, 'misses': self.cache_misses}
     
     def load_game(self, player_name):
-        with self.lock:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT level, rubless, score, lives FROM game_saves 
-                WHERE player_name = ? ORDER BY save_date DESC LIMIT 1
-            ''', (player_name,))
-            
-            result = cursor.fetchone()
-            conn.close()
-            
-            if result:
-                return {
-                    'level': result[0],
-                    'rubless': result[1],
-                    'score': result[2],
-                    'lives': result[3]
-                }
-            return None
-    
-    def save_level_result(self, player_name, level, rubles_collected, pmcs_defeated, completion_time, score, completed=True):
-        with self.lock:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO level_results 
-                (player_name, level, rubles_collected, pmcs_defeated, completion_time, score, completed, play_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (player_name, level, rubles_collected, pmcs_defeated, completion_time, score, completed, datetime.now()))
-            
-            self._update_high_scores(conn, cursor, player_name, score, rubles_collected)
-            
-            conn.commit()
-            conn.close()
+        return self._cached(self.save_cache, player_name, self._load_game)
+    
+    def _load_game(self, player_name):
+        cursor = self.conn.execute(LOAD_GAME_SELECT, (player_name,))
+        result = cursor.fetchone()
+        
+        if result:
+            return {
+                'level': result[0],
+                'rubless': result[1],
+                'score': result[2],
+                'lives': result[3]
+            }
+        return None
+    
+    def save_snapshot(self, player_name, level, data):
+        with self.lock, self.conn:
+            self._save_snapshot(self.conn.cursor(), player_name, level, data)
+    
+    def _save_snapshot(self, cursor, player_name, level, data):
+        # data: bytes from snapshot.capture(); one snapshot per player.
+        self.snapshot_cache.pop(player_name, None)
+        cursor.execute(SNAPSHOT_UPSERT, (player_name, level, data, datetime.now()))
+    
+    def delete_snapshot(self, player_name):
+        with self.lock, self.conn:
+            self._delete_snapshot(self.conn.cursor(), player_name)
+    
+    def _delete_snapshot(self, cursor, player_name):
+        self.snapshot_cache.pop(player_name, None)
+        cursor.execute(SNAPSHOT_DELETE, (player_name,))
+    
+    def load_snapshot(self, player_name):
+        return self._cached(self.snapshot_cache, player_name, self._load_snapshot)
+    
+    def _load_snapshot(self, player_name):
+        result = self.conn.execute(SNAPSHOT_SELECT, (player_name,)).fetchone()
+        if result:
+            return {'level': result[0], 'data': result[1]}
+        return None
+    
+    def save_level_result(self, player_name, level, rubles_collected, pmcs_defeated, completion_time, score, completed=True, events=None):
+        with self.lock, self.conn:
+            self._save_level_result(self.conn.cursor(), player_name, level, rubles_collected,
+                                    pmcs_defeated, completion_time, score, completed, events)
+    
+    def _save_level_result(self, cursor, player_name, level, rubles_collected, pmcs_defeated, completion_time, score, completed=True, events=None):
+        # events: the run's telemetry.RunTelemetry, stored next to the row.
+        self.stats_cache.pop(level, None)
+        self.high_scores_cache.clear()
+        cursor.execute(LEVEL_RESULT_INSERT,
+                       (player_name, level, rubles_collected, pmcs_defeated,
+                        completion_time, score, completed, datetime.now()))
+        if events is not None:
+            cursor.execute(RUN_EVENTS_INSERT, (cursor.lastrowid, level, len(events), events.to_bytes()))
+        
+        cursor.execute(LEVEL_AGGREGATE_UPSERT,
+                       (level, 1 if completed else 0, rubles_collected or 0,
+                        completion_time, 0 if completion_time is None else 1))
+        
+        # A failed run counts in the level stats but not in the high scores.
+        if completed:
+            self._update_high_scores(self.conn, cursor, player_name, score, rubles_collected)
+    
+    def run_batch(self, operations):
+        # operations: [(method_name, args, kwargs), ...] for the write methods
+        # above, applied in order inside a single transaction.
+        with self.lock, self.conn:
+            cursor = self.conn.cursor()
+            for name, args, kwargs in operations:
+                getattr(self, '_' + name)(cursor, *args, **kwargs)
     
     def _update_high_scores(self, conn, cursor, player_name, score, rubless):
-        cursor.execute('''
-            SELECT total_score, total_rubless, levels_completed 
-            FROM high_scores WHERE player_name = ?
-        ''', (player_name,))
+        cursor.execute(HIGH_SCORE_SELECT, (player_name,))
         
         result = cursor.fetchone()
         
@@ -120,69 +363,146 @@ class GameDatabase:
             new_rubless = result[1] + rubless
             new_levels = result[2] + 1
             
-            cursor.execute('''
-                UPDATE high_scores 
-                SET total_score = ?, total_rubless = ?, levels_completed = ?, record_date = ?
-                WHERE player_name = ?
-            ''', (new_score, new_rubless, new_levels, datetime.now(), player_name))
+            cursor.execute(HIGH_SCORE_UPDATE, (new_score, new_rubless, new_levels, datetime.now(), player_name))
         else:
-            cursor.execute('''
-                INSERT INTO high_scores (player_name, total_score, total_rubless, levels_completed, record_date)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (player_name, score, rubless, 1, datetime.now()))
+            cursor.execute(HIGH_SCORE_INSERT, (player_name, score, rubless, 1, datetime.now()))
+    
+    def iter_run_events(self, level=None, page_size=64):
+        # (result_id, level, data) for every stored run, optionally of one
+        # level. Fetched a page at a time, so the lock is only held per page
+        # and the blobs are never all in memory.
+        last_id = 0
+        while True:
+            with self.lock:
+                if level is None:
+                    rows = self.conn.execute(RUN_EVENTS_PAGE, (last_id, page_size)).fetchall()
+                else:
+                    rows = self.conn.execute(RUN_EVENTS_LEVEL_PAGE, (level, last_id, page_size)).fetchall()
+            yield from rows
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1][0]
     
     def get_level_stats(self, level):
-        with self.lock:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT 
-                    AVG(rubles_collected) as avg_rubles,
-                    AVG(completion_time) as avg_time,
-                    COUNT(*) as play_count,
-                    SUM(CASE WHEN completed THEN 1 ELSE 0 END) as completed_count
-                FROM level_results 
-                WHERE level = ?
-            ''', (level,))
-            
-            result = cursor.fetchone()
-            conn.close()
-            
-            if result and result[2] > 0:
-                return {
-                    'avg_rubles': result[0] or 0,
-                    'avg_time': result[1] or 0,
-                    'play_count': result[2],
-                    'completion_rate': (result[3] / result[2]) * 100 if result[2] > 0 else 0
-                }
-            return None
+        return self._cached(self.stats_cache, level, self._get_level_stats)
+    
+    def _get_level_stats(self, level):
+        cursor = self.conn.execute(LEVEL_STATS_SELECT, (level,))
+        result = cursor.fetchone()
+        
+        if result and result[3] > 0:
+            total_rubles, total_time, timed_count, play_count, completed_count = result
+            return {
+                'avg_rubles': total_rubles / play_count,
+                'avg_time': total_time / timed_count if timed_count > 0 else 0,
+                'play_count': play_count,
+                'completion_rate': (completed_count / play_count) * 100
+            }
+        return None
     
     def get_high_scores(self, limit=10):
-        with self.lock:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
+        return self._cached(self.high_scores_cache, limit, self._get_high_scores)
+    
+    def _get_high_scores(self, limit):
+        cursor = self.conn.execute(HIGH_SCORES_SELECT, (limit,))
+        results = cursor.fetchall()
+        
+        return [
+            {
+                'player_name': r[0],
+                'total_score': r[1],
+                'total_rubless': r[2],
+                'levels_completed': r[3]
+            }
+            for r in results
+        ]
+
+
+
+class SaveWriter:
+    # Write-behind front end for GameDatabase: the game thread only enqueues,
+    # a single worker drains the queue and commits whatever has piled up as
+    # one transaction. One FIFO and one worker keep saves in submit order.
+    def __init__(self, db, max_pending=256, max_batch=64):
+        self.db = db
+        self.max_batch = max_batch
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.pending = 0
+        self.pending_changed = threading.Condition()
+        # Saves that could not be written, as (method name, error).
+        self.failed = []
+        self.closed = False
+        self.worker = threading.Thread(target=self._run, name="SaveWriter", daemon=True)
+        self.worker.start()
+    
+    def save_game(self, player_name, level, rubless, score, lives):
+        self._enqueue('save_game', (player_name, level, rubless, score, lives), {})
+    
+    def save_snapshot(self, player_name, level, data):
+        self._enqueue('save_snapshot', (player_name, level, data), {})
+    
+    def delete_snapshot(self, player_name):
+        self._enqueue('delete_snapshot', (player_name,), {})
+    
+    def save_level_result(self, player_name, level, rubles_collected, pmcs_defeated, completion_time, score, completed=True, events=None):
+        self._enqueue('save_level_result',
+                      (player_name, level, rubles_collected, pmcs_defeated, completion_time, score),
+                      {'completed': completed, 'events': events})
+    
+    def _enqueue(self, name, args, kwargs):
+        if self.closed:
+            raise RuntimeError("SaveWriter is closed")
+        with self.pending_changed:
+            self.pending += 1
+        # Blocks only when max_pending saves are already waiting on the disk.
+        self.queue.put((name, args, kwargs))
+    
+    def flush(self, timeout=None):
+        # Waits until everything enqueued so far is written (or has failed,
+        # see _write). Returns False on timeout.
+        with self.pending_changed:
+            return self.pending_changed.wait_for(lambda: self.pending == 0, timeout)
+    
+    def close(self, timeout=None):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.worker.join(timeout)
+    
+    def _run(self):
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
             
-            cursor.execute('''
-                SELECT player_name, total_score, total_rubless, levels_completed 
-                FROM high_scores 
-                ORDER BY total_score DESC 
-                LIMIT ?
-            ''', (limit,))
+            if None in batch:
+                running = False
+                batch = batch[:batch.index(None)]
             
-            results = cursor.fetchall()
-            conn.close()
+            if batch:
+                self._write(batch)
             
-            return [
-                {
-                    'player_name': r[0],
-                    'total_score': r[1],
-                    'total_rubless': r[2],
-                    'levels_completed': r[3]
-                }
-                for r in results
-            ]
-    
-    # def close_all_connections(self):
-    #     with self.lock:
-    #         pass
\ No newline at end of file
+            with self.pending_changed:
+                self.pending -= len(batch)
+                self.pending_changed.notify_all()
+    
+    def _write(self, batch):
+        # A failed transaction is rolled back as a whole, so the batch is
+        # retried one save at a time: only the save that fails is lost. It
+        # goes into self.failed rather than being raised into the game.
+        try:
+            self.db.run_batch(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                self.failed.append((batch[0][0], e))
+                return
+            for operation in batch:
+                try:
+                    self.db.run_batch([operation])
+                except Exception as error:
+                    self.failed.append((operation[0], error))
@@ -0,0 +1,140 @@
+import random
+import arcade
+from arcade.particles import Emitter, EmitBurst, FadeParticle
+
+
+BURST_COLORS = [
+    arcade.color.RED,
+    arcade.color.ORANGE_RED,
+    arcade.color.ORANGE,
+    arcade.color.YELLOW,
+    arcade.color.WHITE
+]
+
+
+class PooledParticle(FadeParticle):
+    def reset(self, texture, change_xy, lifetime, scale=1.0, start_alpha=255, end_alpha=0):
+        # Same state FadeParticle.__init__ sets up, minus the Sprite construction.
+        self.texture = texture
+        self.scale = scale
+        self.position = (0.0, 0.0)
+        self.change_x, self.change_y = change_xy
+        self.angle = 0.0
+        self.change_angle = 0.0
+        self.lifetime_original = lifetime
+        self.lifetime_elapsed = 0.0
+        self.start_alpha = start_alpha
+        self.end_alpha = end_alpha
+        self.alpha = start_alpha
+
+
+class PooledEmitter(Emitter):
+    def __init__(self, system):
+        super().__init__((0, 0), EmitBurst(0), system.make_particle)
+        self.system = system
+        self.texture = None
+        self.scale = 1.0
+        self.start_alpha = 255
+
+    def reset(self, x, y, count, texture, scale, start_alpha):
+        self.center_x = x
+        self.center_y = y
+        self.rate_factory = EmitBurst(count)
+        self.texture = texture
+        self.scale = scale
+        self.start_alpha = start_alpha
+
+    def update(self, delta_time=1 / 60):
+        emit_count = self.rate_factory.how_many(delta_time, len(self._particles))
+        for _ in range(emit_count):
+            self._emit()
+        self._particles.update(delta_time)
+
+        # Finished particles go back to the pool instead of being dropped.
+        finished = [p for p in self._particles if p.can_reap()]
+        for particle in finished:
+            self._particles.remove(particle)
+            self.system.release_particle(particle)
+
+
+class ParticleSystem:
+    def __init__(self, max_pooled=2000):
+        self.max_pooled = max_pooled
+        self.emitters = []
+        self.free_emitters = []
+        self.free_particles = []
+        self.textures = {}
+        self.particles_created = 0
+        # Set by the quality governor: share of each burst's particles and
+        # how many of its colored layers are emitted.
+        self.particle_share = 1.0
+        self.layers = len(BURST_COLORS)
+        # Own generator, so a recorded run can replay the same bursts.
+        self.random = random.Random()
+
+    def seed(self, seed):
+        self.random.seed(seed)
+
+    def set_quality(self, particle_share, layers):
+        self.particle_share = particle_share
+        self.layers = layers
+
+    def circle_texture(self, diameter, color):
+        key = (diameter, tuple(color))
+        texture = self.textures.get(key)
+        if texture is None:
+            texture = arcade.make_circle_texture(diameter, color)
+            self.textures[key] = texture
+        return texture
+
+    def make_particle(self, emitter):
+        change_xy = (self.random.uniform(-150, 150), self.random.uniform(-150, 150))
+        lifetime = self.random.uniform(0.3, 0.7)
+
+        if self.free_particles:
+            particle = self.free_particles.pop()
+            particle.reset(emitter.texture, change_xy, lifetime,
+                           scale=emitter.scale, start_alpha=emitter.start_alpha)
+        else:
+            particle = PooledParticle(emitter.texture, change_xy, lifetime,
+                                      scale=emitter.scale, start_alpha=emitter.start_alpha)
+            self.particles_created += 1
+        return particle
+
+    def release_particle(self, particle):
+        if len(self.free_particles) < self.max_pooled:
+            self.free_particles.append(particle)
+
+    def create_burst_explosion(self, x, y):
+        for i, color in enumerate(BURST_COLORS[:self.layers]):
+            particle_count = max(1, round((15 - i * 3) * self.particle_share))
+
+            if self.free_emitters:
+                emitter = self.free_emitters.pop()
+            else:
+                emitter = PooledEmitter(self)
+            emitter.reset(x, y, particle_count, self.circle_texture(6 + i, color),
+                          scale=0.5 + i * 0.1, start_alpha=150 + i * 20)
+            self.emitters.append(emitter)
+
+    def update(self, delta_time=1 / 60):
+        active = []
+        for emitter in self.emitters:
+            emitter.update(delta_time)
+            if emitter.can_reap():
+                self.free_emitters.append(emitter)
+            else:
+                active.append(emitter)
+        self.emitters = active
+
+    def draw(self):
+        for emitter in self.emitters:
+            emitter.draw()
+
+    def clear(self):
+        for emitter in self.emitters:
+            for particle in list(emitter._particles):
+                emitter._particles.remove(particle)
+                self.release_particle(particle)
+            self.free_emitters.append(emitter)
+        self.emitters = []
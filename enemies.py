@@ -0,0 +1,150 @@
+import numpy as np
+
+
+PATROL = 0
+BOB = 1
+CHASE = 2
+
+BEHAVIORS = {
+    'patrol': PATROL,
+    'bob': BOB,
+    'chase': CHASE,
+}
+
+PMC_SPEED = 2
+BOB_AMPLITUDE = 12
+BOB_SPEED = 0.08
+
+
+class EnemyEngine:
+    # Structure-of-arrays state for every PMC in a level. Each tick moves all
+    # of them with a handful of NumPy operations; sprites are only touched
+    # when positions are written back, and only the ones in use.
+    ARRAYS = ('x', 'y', 'prev_x', 'prev_y', 'base_y', 'vx', 'left', 'right', 'phase', 'behavior', 'alive')
+
+    def __init__(self, capacity=64):
+        self.count = 0
+        self.sprites = []
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.prev_x = np.zeros(capacity)
+        self.prev_y = np.zeros(capacity)
+        self.base_y = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.left = np.zeros(capacity)
+        self.right = np.zeros(capacity)
+        self.phase = np.zeros(capacity)
+        self.behavior = np.zeros(capacity, dtype=np.int8)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.dead = 0
+        # Bumped whenever compact() reshuffles indices, so index-based
+        # structures built on top (see collisions.EnemyGrid) know to rebuild.
+        self.compactions = 0
+
+    def _grow(self, capacity):
+        for name in self.ARRAYS:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def add(self, sprite, left_bound, right_bound, speed=PMC_SPEED, behavior=PATROL):
+        if self.count == len(self.x):
+            self._grow(max(64, len(self.x) * 2))
+        i = self.count
+        self.x[i] = self.prev_x[i] = sprite.center_x
+        self.y[i] = self.prev_y[i] = sprite.center_y
+        self.base_y[i] = sprite.center_y
+        self.vx[i] = speed
+        self.left[i] = left_bound
+        self.right[i] = right_bound
+        self.phase[i] = 0.0
+        self.behavior[i] = behavior
+        self.alive[i] = True
+        sprite.engine_index = i
+        self.sprites.append(sprite)
+        self.count += 1
+
+    def remove(self, sprite):
+        i = sprite.engine_index
+        if i is not None and self.alive[i]:
+            self.alive[i] = False
+            sprite.engine_index = None
+            self.dead += 1
+            if self.dead * 2 > self.count:
+                self.compact()
+
+    def compact(self):
+        keep = np.flatnonzero(self.alive[:self.count])
+        for name in self.ARRAYS:
+            array = getattr(self, name)
+            array[:len(keep)] = array[keep]
+        self.sprites = [self.sprites[i] for i in keep.tolist()]
+        for i, sprite in enumerate(self.sprites):
+            sprite.engine_index = i
+        self.count = len(keep)
+        self.alive[self.count:] = False
+        self.dead = 0
+        self.compactions += 1
+
+    def step(self, target_x=None):
+        n = self.count
+        self.prev_x[:n] = self.x[:n]
+        self.prev_y[:n] = self.y[:n]
+        x = self.x[:n]
+        vx = self.vx[:n]
+        behavior = self.behavior[:n]
+
+        chase = behavior == CHASE
+        if target_x is not None and chase.any():
+            # Chasers keep their speed but head towards the target, staying
+            # inside their patrol bounds.
+            speed = np.abs(vx[chase])
+            direction = np.sign(target_x - x[chase])
+            vx[chase] = np.where(direction == 0, vx[chase], speed * direction)
+
+        x += vx
+        left = self.left[:n]
+        right = self.right[:n]
+        # Same order as the old per-sprite if/elif: a PMC at its left bound
+        # turns right even when the bounds coincide.
+        turn_right = x <= left
+        np.copyto(vx, np.abs(vx), where=turn_right)
+        np.copyto(vx, -np.abs(vx), where=(x >= right) & ~turn_right)
+        if chase.any():
+            np.clip(x, left, right, out=x, where=chase)
+
+        bob = behavior == BOB
+        if bob.any():
+            self.phase[:n][bob] += BOB_SPEED
+            self.y[:n][bob] = self.base_y[:n][bob] + BOB_AMPLITUDE * np.sin(self.phase[:n][bob])
+
+    def extent(self, i):
+        # Box an enemy can occupy (by its center) over its whole life: the
+        # patrol bounds plus one step of overshoot, and the bob amplitude.
+        speed = abs(self.vx[i])
+        left = min(self.x[i], self.left[i]) - speed
+        right = max(self.x[i], self.right[i]) + speed
+        if self.behavior[i] == BOB:
+            return left, self.base_y[i] - BOB_AMPLITUDE, right, self.base_y[i] + BOB_AMPLITUDE
+        return left, self.y[i], right, self.y[i]
+
+    def sync_sprites(self, sprites, alpha=1.0):
+        # Positions live in the arrays; a sprite only gets its engine
+        # position written back when something is about to look at it (a
+        # collision test, the culled draw). alpha < 1 places the sprites
+        # between the last two ticks, for drawing.
+        sprites = [sprite for sprite in sprites if sprite.engine_index is not None]
+        if not sprites:
+            return
+        indices = np.fromiter((sprite.engine_index for sprite in sprites), dtype=np.intp, count=len(sprites))
+        xs, ys = self.x[indices], self.y[indices]
+        if alpha < 1.0:
+            prev_x, prev_y = self.prev_x[indices], self.prev_y[indices]
+            xs = prev_x + (xs - prev_x) * alpha
+            ys = prev_y + (ys - prev_y) * alpha
+        # change_x gets the current patrol velocity, so code reading the
+        # sprite sees the direction the engine is moving it in.
+        for sprite, x, y, vx in zip(sprites, xs.tolist(), ys.tolist(), self.vx[indices].tolist()):
+            sprite.position = (x, y)
+            sprite.change_x = vx
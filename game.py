@@ -1,182 +1,290 @@
-import arcade
-from arcade.particles import *
-import time
-from levels import Level
-from database import GameDatabase
+import importlib
+import math
+import os
 import random
+import time
+import types
+
+import arcade
+from database import GameDatabase, SaveWriter
+from effects import ParticleSystem
+from hud import HUD
+from timestep import FixedTimestep, MAX_CATCH_UP_STEPS, lerp_xy
+from textures import TEXTURES
+from profiler import PROFILER, ProfilerOverlay
+from culling import WorldView, visible_bounds
+from quality import QualityGovernor
+from preload import LevelPreloader, BackgroundTask
 
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 SCREEN_TITLE = "Bugilla!"
-GRAVITY = 1
-PLAYER_JUMP_SPEED = 20
-PLAYER_MOVE_SPEED = 5
 
 CAMERA_SPEED = 0.1
 ZOOM_LEVEL = 0.8
 
+# Seconds of game time between autosaved snapshots of the running level.
+AUTOSAVE_INTERVAL = 5.0
 
-class Player(arcade.Sprite):
-    def __init__(self):
-        super().__init__("assets/tagilla.png")
-        self.scale = 0.15
-        self.center_x = 50
-        self.center_y = 150
-        self.change_x = 0
-        self.change_y = 0
-        self.jumping = False
-        self.rubless = 0
-        self.score = 0
-        self.lives = 3
-        self.level = 1
+# Size of the levels started from the menu's "random level" entry.
+GENERATED_LEVEL = {'platforms': 200, 'rubles_density': 1.0, 'pmc_density': 0.4}
 
-class Rubles(arcade.Sprite):
-    def __init__(self, x, y):
-        super().__init__("assets/rubles.png", 0.1)
-        self.center_x = x
-        self.center_y = y
+MUSIC_FILE = "assets/music/background.mp3"
+MUSIC_VOLUME = 0.3
 
-class PMC(arcade.Sprite):
-    def __init__(self, x, y, left_bound, right_bound):
-        super().__init__("assets/pmc.png", 0.1)
-        self.center_x = x
-        self.center_y = y
-        self.change_x = 2
-        self.left_bound = left_bound
-        self.right_bound = right_bound
+# Imported on a background thread after startup rather than before the
+# first frame: simulation and everything built on it pull in NumPy.
+GAMEPLAY_MODULES = ("simulation", "replay", "snapshot", "telemetry", "levelgen")
 
-class Platform(arcade.Sprite):
-    def __init__(self, x, y, width, height):
-        super().__init__("assets/block.png")
-        self.center_x = x + width / 2
-        self.center_y = y + height / 2
-        self.width = width
-        self.height = height
 
-class Flag(arcade.Sprite):
-    def __init__(self, x, y):
-        super().__init__()
-        self.flag_textures = []
-        for i in range(3):
-            texture = arcade.load_texture(f'assets/flag/flag{i}.png')
-            self.flag_textures.append(texture)
-        
-        self.scale = 3.0
-        self.texture = self.flag_textures[0]
-        self.center_x = x
-        self.center_y = y
+def key_commands(simulation):
+    return {
+        arcade.key.LEFT: simulation.MOVE_LEFT,
+        arcade.key.RIGHT: simulation.MOVE_RIGHT,
+        arcade.key.UP: simulation.JUMP,
+        arcade.key.SPACE: simulation.JUMP,
+    }
 
-        self.current_frame = 0
-        self.animation_speed = 0.15
-        self.animation_timer = 0.0
-        self.animation_active = True
-    
-    def update_animation(self, delta_time):
-        if not self.animation_active or len(self.flag_textures) == 0:
-            return
-        
-        self.animation_timer += delta_time
 
-        if self.animation_timer >= self.animation_speed:
-            self.animation_timer = 0.0
+def open_database():
+    # Opening runs the schema migrations, so it is done off the main thread.
+    db = GameDatabase()
+    return db, SaveWriter(db)
 
-            self.current_frame += 1
 
-            if self.current_frame >= len(self.flag_textures):
-                self.current_frame = 0
+def import_gameplay():
+    # The GAMEPLAY_MODULES as attributes: gameplay.simulation, gameplay.replay...
+    return types.SimpleNamespace(**{name: importlib.import_module(name) for name in GAMEPLAY_MODULES})
+
+
+def load_assets():
+    gameplay = import_gameplay()
+    TEXTURES.preload()
+    return gameplay
+
+
+def load_music():
+    # Only opens the file: a streaming sound is decoded bit by bit while it
+    # plays, instead of all at once before it can start.
+    if not os.path.exists(MUSIC_FILE):
+        return None
+    return arcade.Sound(MUSIC_FILE, streaming=True)
 
-            self.texture = self.flag_textures[self.current_frame]
-    
-    def start_animation(self):
-        self.animation_active = True
-    
-    def stop_animation(self):
-        self.animation_active = False
 
 class GameWindow(arcade.Window):
     def __init__(self):
         super().__init__(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE)
         
-        self.players = None
-        self.platforms = None
-        self.rubless = None
-        self.pmcs = None
-        self.flags = None
-        self.physics_engine = None
+        self.world = None
+        self.world_view = None
         self.game_state = "menu"
         self.player_name = "Игрок"
         self.current_level = 1
-        self.level_start_time = 0
+        # Seed of the generated level being played, None for levels 1-3.
+        self.generated_seed = None
         self.level_completion_time = 0
-        self.pmcs_defeated = 0
+        # Game time of the last snapshot; F5 saves one, F9 loads it back.
+        self.last_autosave = 0.0
+        # Events and frame times of the current run, saved with its result.
+        self.telemetry = None
+        self.key_commands = {}
+        # How long the last level switch blocked the game, in ms.
+        self.transition_time = 0.0
         
         self.camera = None
-        self.gui_camera = None
+        self.gui_camera = arcade.Camera2D()
         self.camera_x = 0
         self.camera_y = 0
         self.target_zoom = ZOOM_LEVEL
-        self.db = GameDatabase()
         
-        self.emitters = []
+        self.timestep = FixedTimestep()
+        self.previous_player_position = (0, 0)
+        self.previous_camera_position = (0, 0)
+        # The database opens on a background thread; the rest of the
+        # background startup work starts after the first frame.
+        self.storage = BackgroundTask(open_database, "open-database")
+        self.assets = None
+        # The GAMEPLAY_MODULES, once imported (see gameplay_modules).
+        self.gameplay = None
+        self.music = None
+        self.screens_pending = True
+        # perf_counter() at the end of the first on_draw.
+        self.first_frame_time = None
+        
+        self.preloader = LevelPreloader(self.create_world)
+        
+        self.particles = ParticleSystem()
+        self.hud = HUD(SCREEN_WIDTH, SCREEN_HEIGHT)
+        # Scales effects down when update + draw run over the frame budget
+        # and back up when there is room again.
+        self.quality = QualityGovernor()
+        self.apply_quality()
+        
+        # F3 toggles profiling and its overlay, F4 exports a Chrome trace.
+        self.profiler = PROFILER
+        self.profiler_overlay = ProfilerOverlay(PROFILER, SCREEN_WIDTH - 310, SCREEN_HEIGHT - 150)
+        
+        # With record_dir set every level run is saved there as a replay file.
+        self.record_dir = None
+        self.recording = None
+        self.recordings_saved = 0
+        self.replay = None
+        self.replay_speed = 1.0
 
         self.bg_music = None
         
         arcade.set_background_color(arcade.color.SKY_BLUE)
     
-    def setup_level(self, level_num):
+    @property
+    def db(self):
+        # Opened in the background at startup; the first use waits for it.
+        return self.storage.result()[0]
+    
+    @property
+    def saves(self):
+        return self.storage.result()[1]
+    
+    def gameplay_modules(self):
+        # Set by finish_startup once the background import is done. Anything
+        # that needs them sooner (a replay from the command line, a level
+        # started right away, a benchmark) waits for that import, or does it
+        # here if it has not started yet.
+        if self.gameplay is None:
+            self.gameplay = self.assets.result() if self.assets is not None else import_gameplay()
+        return self.gameplay
+    
+    def create_world(self, level_num, level=None):
+        # Stream chunks around the camera's visible area (zoomed out, so the
+        # view is larger than the window).
+        return self.gameplay_modules().simulation.Simulation(
+            level_num, level, streaming=True,
+            view=(SCREEN_WIDTH / ZOOM_LEVEL, SCREEN_HEIGHT / ZOOM_LEVEL))
+    
+    def setup_level(self, level_num, world=None, seed=None):
+        # world: an already built Simulation for level_num (see LevelPreloader).
+        # seed: particle seed, given when replaying a recorded run.
+        gameplay = self.gameplay_modules()
+        
         self.camera = arcade.Camera2D()
-        self.gui_camera = arcade.Camera2D()
-        self.camera_x = self.player.center_x + 400
-        self.camera_y = self.player.center_y + 400
-        self.gui_camera.position = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+        self.camera.zoom = ZOOM_LEVEL
+        self.camera_x, self.camera_y = self.camera.position
         
         self.current_level = level_num
-        levels = Level.get_level(level_num)
-        
-        self.player = Player()
-        self.player.level = level_num
-        self.player.center_x, self.player.center_y = levels['player_start']
-        self.players = arcade.SpriteList()
-        self.players.append(self.player)
-        
-        self.platforms = arcade.SpriteList()
-        for plat in levels['platforms']:
-            platform = Platform(*plat)
-            self.platforms.append(platform)
-        
-        self.rubless = arcade.SpriteList()
-        for rubles_pos in levels['rubless']:
-            rubles = Rubles(*rubles_pos)
-            self.rubless.append(rubles)
-        
-        self.pmcs = arcade.SpriteList()
-        for pmc_data in levels['pmcs']:
-            pmc = PMC(*pmc_data)
-            self.pmcs.append(pmc)
-        
-        self.flags = arcade.SpriteList()
-        self.flag = Flag(*levels['flag'])
-        self.flags.append(self.flag)
-        
-        self.physics_engine = arcade.PhysicsEnginePlatformer(
-            self.player,
-            self.platforms,
-            gravity_constant=GRAVITY
-        )
-
-        self.level_start_time = time.time()
-        self.pmcs_defeated = 0
-
-        arcade.set_background_color(levels['background_color'])
+        self.generated_seed = None
+        self.last_autosave = 0.0
+        # A new object rather than a cleared one: the last run's may still
+        # be waiting in the SaveWriter queue.
+        self.telemetry = gameplay.telemetry.RunTelemetry()
+        self.key_commands = key_commands(gameplay.simulation)
+        if self.world is not None:
+            self.world.close()
+        self.world = world if world is not None else self.create_world(level_num)
+        self.world_view = WorldView(self.world)
+        self.particles.clear()
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.particles.seed(seed)
+        
+        self.recording = None
+        if self.record_dir is not None:
+            self.recording = gameplay.replay.Recording(level_num, self.world.level, seed, (self.camera_x, self.camera_y),
+                                       self.world.streamer.view, CAMERA_SPEED)
+        
+        self.timestep.reset()
+        self.previous_player_position = self.world.player.position
+        self.previous_camera_position = (self.camera_x, self.camera_y)
+
+        arcade.set_background_color(self.world.level['background_color'])
+    
+    def start_generated_level(self, seed):
+        # Generated levels are not saved to the database or recorded: they
+        # are not in levels.py, so neither a save nor a replay could
+        # rebuild them.
+        level = self.gameplay_modules().levelgen.generate_level(seed, **GENERATED_LEVEL)
+        self.setup_level(0, self.create_world(0, level))
+        self.generated_seed = seed
+        self.recording = None
+        self.game_state = "playing"
+    
+    def save_snapshot(self):
+        # Generated levels and replays are never saved (see
+        # start_generated_level).
+        if self.generated_seed is not None or self.replay is not None:
+            return
+        with self.profiler.scope("snapshot"):
+            data = self.gameplay.snapshot.capture(self.world)
+        self.saves.save_snapshot(self.player_name, self.current_level, data)
+        self.last_autosave = self.world.elapsed_time
+    
+    def load_snapshot(self, snapshot):
+        # Restarts the snapshot's level and puts the saved state into it.
+        # A run resumed mid-level cannot be replayed, so it is not recorded.
+        self.setup_level(snapshot['level'])
+        snapshots = self.gameplay.snapshot
+        try:
+            snapshots.restore(self.world, snapshot['data'])
+        except snapshots.SnapshotError as e:
+            print(f"Снимок не загружен: {e}")
+        self.recording = None
+        player = self.world.player
+        self.camera_x, self.camera_y = player.position
+        self.world.view_center = player.position
+        self.previous_camera_position = player.position
+        self.previous_player_position = player.position
+        self.last_autosave = self.world.elapsed_time
+        self.game_state = "playing"
+    
+    def level_label(self):
+        if self.generated_seed is not None:
+            return f"случайный #{self.generated_seed}"
+        return self.current_level
     
     def setup(self):
+        # Only the menu is needed for the first frame; everything else is
+        # loaded once it is on screen (see start_loading).
         self.game_state = "menu"
-        self.start_background_music()
+    
+    def start_loading(self):
+        # The music stream, the gameplay modules and the textures load on
+        # background threads, and finish_startup does the rest on the main
+        # thread. Started after the first frame rather than before it, which
+        # they would only slow down by competing for the interpreter.
+        self.assets = BackgroundTask(load_assets, "load-assets")
+        self.music = BackgroundTask(load_music, "load-music")
+    
+    def finish_startup(self):
+        # At most one step per frame, between levels: textures go into the
+        # atlas once decoded, then the other HUD screens are laid out ahead
+        # of their first use.
+        if self.assets is not None:
+            if self.assets.ready():
+                self.gameplay = self.assets.result()
+                TEXTURES.preload(self.ctx.default_atlas)
+                self.assets = None
+        elif self.screens_pending:
+            self.screens_pending = self.hud.build_next()
+    
+    def startup_finished(self):
+        return (self.first_frame_time is not None and self.assets is None and self.music is None
+                and not self.screens_pending and self.storage.ready())
+    
+    def shut_down(self):
+        # Stops the background threads; closing the SaveWriter writes out
+        # whatever saves are still queued.
+        self.preloader.cancel()
+        if self.world is not None:
+            self.world.close()
+        self.saves.close()
+        self.db.close()
+    
+    def on_close(self):
+        self.shut_down()
+        super().on_close()
     
     def on_draw(self):
+        start = time.perf_counter()
+        self.profiler.frame()
         self.clear()
-        for e in self.emitters:
-            e.draw()
         if self.game_state == "menu":
             self.draw_menu()
         elif self.game_state == "playing":
@@ -185,312 +293,367 @@ class GameWindow(arcade.Window):
             self.draw_level_complete()
         elif self.game_state == "game_over":
             self.draw_game_over()
-    
-    
+        
+        if self.profiler.enabled:
+            self.gui_camera.use()
+            self.profiler_overlay.draw()
+        
+        if self.game_state == "playing":
+            self.quality.add_draw((time.perf_counter() - start) * 1000)
+        if self.first_frame_time is None:
+            self.first_frame_time = time.perf_counter()
+            self.start_loading()
     
     def start_background_music(self):
-        music_file = "assets/music/background.mp3"
-            
-        import os
-        if os.path.exists(music_file):
-            self.background_music = arcade.load_sound(music_file)
-            arcade.play_sound(self.background_music, volume=0.3, loop=True)
-        
-
+        # pyglet loops a streaming source by seeking it back to the start.
+        try:
+            sound = self.music.result()
+        except Exception as e:
+            print(f"Музыка не загружена: {e}")
+            sound = None
+        self.music = None
+        if sound is not None:
+            self.bg_music = arcade.play_sound(sound, volume=MUSIC_VOLUME, loop=True)
 
     def draw_game(self):
+        # The simulation is up to one tick ahead of real time; draw the
+        # player, PMCs and camera at the interpolated point in between.
+        world = self.world
+        alpha = self.timestep.alpha
+        camera_position = lerp_xy(self.previous_camera_position, (self.camera_x, self.camera_y), alpha)
+        self.camera.position = camera_position
+        player_position = world.player.position
+        world.player.position = lerp_xy(self.previous_player_position, player_position, alpha)
+        
+        with self.profiler.scope("draw.cull"):
+            self.world_view.update(*visible_bounds(camera_position[0], camera_position[1],
+                                                   self.camera.zoom, self.width, self.height), alpha)
+        
         self.camera.use()
 
         self.clear()
-        self.platforms.draw()
-        self.rubless.draw()
-        self.pmcs.draw()
-        self.flags.draw()
-        self.players.draw()
-
-        arcade.draw_text(f"Уровень: {self.current_level}", 10, SCREEN_HEIGHT - 30, 
-                        arcade.color.WHITE, 18)
-        arcade.draw_text(f"Очки: {self.player.score}", 10, SCREEN_HEIGHT - 60, 
-                        arcade.color.WHITE, 18)
-        arcade.draw_text(f"Монеты: {self.player.rubless}", 10, SCREEN_HEIGHT - 90, 
-                        arcade.color.WHITE, 18)
-        arcade.draw_text(f"Жизни: {self.player.lives}", 10, SCREEN_HEIGHT - 120, 
-                        arcade.color.WHITE, 18)
+        with self.profiler.scope("draw.world"):
+            self.world_view.draw()
 
-        elapsed_time = int(time.time() - self.level_start_time)
-        arcade.draw_text(f"Время: {elapsed_time} сек", SCREEN_WIDTH - 150, 
-                        SCREEN_HEIGHT - 30, arcade.color.WHITE, 18)
+        with self.profiler.scope("draw.particles"):
+            self.particles.draw()
+        world.player.position = player_position
         
-        for emitter in self.emitters:
-            emitter.draw()
+        self.gui_camera.use()
+        with self.profiler.scope("draw.hud"):
+            self.hud.draw_game(
+                self.level_label(),
+                world.player.score,
+                world.player.rubless,
+                world.player.lives,
+                int(world.elapsed_time),
+                self.quality.settings['name']
+            )
     
     def draw_level_complete(self):
         self.gui_camera.use()
-        arcade.draw_text("УРОВЕНЬ ПРОЙДЕН!", 
-                        SCREEN_WIDTH // 2, SCREEN_HEIGHT - 100,
-                        arcade.color.GOLD, 36, anchor_x="center")
-        
-        arcade.draw_text(f"Уровень: {self.current_level}", 
-                        SCREEN_WIDTH // 2, SCREEN_HEIGHT - 180,
-                        arcade.color.WHITE, 24, anchor_x="center")
-        
-        arcade.draw_text(f"Собрано монет: {self.player.rubless}", 
-                        SCREEN_WIDTH // 2, SCREEN_HEIGHT - 220,
-                        arcade.color.WHITE, 24, anchor_x="center")
-        
-        arcade.draw_text(f"Побеждено врагов: {self.pmcs_defeated}", 
-                        SCREEN_WIDTH // 2, SCREEN_HEIGHT - 260,
-                        arcade.color.WHITE, 24, anchor_x="center")
-        
-        arcade.draw_text(f"Время прохождения: {int(self.level_completion_time)} сек", 
-                        SCREEN_WIDTH // 2, SCREEN_HEIGHT - 300,
-                        arcade.color.WHITE, 24, anchor_x="center")
-        
-        arcade.draw_text(f"Итоговые очки: {self.player.score}", 
-                        SCREEN_WIDTH // 2, SCREEN_HEIGHT - 340,
-                        arcade.color.GOLD, 28, anchor_x="center")
-        
-        if self.current_level < 3:
-            arcade.draw_text("Нажмите SPACE для следующего уровня", 
-                            SCREEN_WIDTH // 2, SCREEN_HEIGHT - 400,
-                            arcade.color.BLACK, 20, anchor_x="center")
-        else:
-            arcade.draw_text("ИГРА ПРОЙДЕНА! Нажмите SPACE для меню", 
-                            SCREEN_WIDTH // 2, SCREEN_HEIGHT - 400,
-                            arcade.color.GOLD, 20, anchor_x="center")
-        
-        arcade.draw_text("Нажмите ESC для сохранения и выхода в меню", 
-                        SCREEN_WIDTH // 2, SCREEN_HEIGHT - 450,
-                        arcade.color.BLACK, 18, anchor_x="center")
+        self.hud.draw_level_complete(
+            self.level_label(),
+            self.world.player.rubless,
+            self.world.pmcs_defeated,
+            int(self.level_completion_time),
+            self.world.player.score,
+            self.current_level >= 3 and self.generated_seed is None
+        )
     
     def draw_menu(self):
-        arcade.draw_text("Bugilla!", 
-                        SCREEN_WIDTH // 2, SCREEN_HEIGHT - 100,
-                        arcade.color.BLACK, 36, anchor_x="center")
-        
-        arcade.draw_text(f"Игрок: {self.player_name}", 
-                        SCREEN_WIDTH // 2, SCREEN_HEIGHT - 180,
-                        arcade.color.DARK_BLUE, 24, anchor_x="center")
-
-        saved_game = self.db.load_game(self.player_name)
-        if saved_game:
-            arcade.draw_text(f"Сохранение: Уровень {saved_game['level']}, Очки: {saved_game['score']}", 
-                            SCREEN_WIDTH // 2, SCREEN_HEIGHT - 220,
-                            arcade.color.BLUE, 18, anchor_x="center")
-        
-        arcade.draw_text("1 - Новая игра", 
-                        SCREEN_WIDTH // 2, SCREEN_HEIGHT - 280,
-                        arcade.color.BLACK, 24, anchor_x="center")
-        
-        arcade.draw_text("2 - Загрузить игру", 
-                        SCREEN_WIDTH // 2, SCREEN_HEIGHT - 320,
-                        arcade.color.BLACK, 24, anchor_x="center")
-        
-        arcade.draw_text("ESC - Выход", 
-                        SCREEN_WIDTH // 2, SCREEN_HEIGHT - 400,
-                        arcade.color.BLACK, 24, anchor_x="center")
+        self.gui_camera.use()
+        # Until the database is open the menu shows without the save line.
+        saved_game = None
+        if self.storage.ready():
+            with self.profiler.scope("db.load_game"):
+                saved_game = self.db.load_game(self.player_name)
+        self.hud.draw_menu(self.player_name, saved_game)
     
     def draw_game_over(self):
         self.gui_camera.use()
-        arcade.draw_text("GAME OVER", 
-                        SCREEN_WIDTH // 2, SCREEN_HEIGHT - 100,
-                        arcade.color.RED, 48, anchor_x="center")
-        
-        arcade.draw_text(f"Ваш счет: {self.player.score}", 
-                        SCREEN_WIDTH // 2, SCREEN_HEIGHT - 180,
-                        arcade.color.WHITE, 28, anchor_x="center")
-        
-        arcade.draw_text("Нажмите SPACE для новой игры", 
-                        SCREEN_WIDTH // 2, SCREEN_HEIGHT - 250,
-                        arcade.color.GREEN, 24, anchor_x="center")
-        
-        arcade.draw_text("Нажмите ESC для выхода в меню", 
-                        SCREEN_WIDTH // 2, SCREEN_HEIGHT - 300,
-                        arcade.color.LIGHT_GRAY, 20, anchor_x="center")
+        self.hud.draw_game_over(self.world.player.score)
     
     def on_update(self, delta_time):
+        if self.music is not None and self.music.ready():
+            self.start_background_music()
         if self.game_state != "playing":
+            self.finish_startup()
             return
         
-        for flag in self.flags:
-            flag.update_animation(delta_time)
+        start = time.perf_counter()
+        frame_time = delta_time
+        world = self.world
+        profiler = self.profiler
+        simulation = self.gameplay.simulation
+        with profiler.scope("flag"):
+            world.flag.update_animation(delta_time * self.quality.settings['animation'])
+        self.telemetry.frame(world.ticks, world.player.center_x, world.player.center_y, delta_time * 1000)
+        
+        if self.replay is not None:
+            delta_time *= self.replay_speed
+        
+        for _ in range(self.timestep.advance(delta_time)):
+            self.previous_player_position = world.player.position
+            self.previous_camera_position = (self.camera_x, self.camera_y)
             
-        self.physics_engine.update()
-        
-        for pmc in self.pmcs:
-            pmc.center_x += pmc.change_x
-
-            if pmc.center_x <= pmc.left_bound:
-                pmc.change_x = abs(pmc.change_x)
-            elif pmc.center_x >= pmc.right_bound:
-                pmc.change_x = -abs(pmc.change_x)
-
-        pmc_hit_list = arcade.check_for_collision_with_list(self.player, self.pmcs)
-        for pmc in pmc_hit_list:
-            if self.player.change_y < 0 and self.player.bottom > pmc.top - 30:
-                self.create_burst_explosion(pmc.center_x, pmc.center_y)
-                
-                pmc.remove_from_sprite_lists()
-                self.pmcs_defeated += 1
-                self.player.score += 100
-                self.player.change_y = PLAYER_JUMP_SPEED / 2
-            else:
-                self.player.lives -= 1
-                if self.player.lives <= 0:
-                    self.game_state = "game_over"
-                else:
-                    levels = Level.get_level(self.current_level)
-                    self.player.center_x, self.player.center_y = levels['player_start']
-                    
-        if self.player.top < 0:
-            self.player.lives -= 1
-            if self.player.lives <= 0:
-                self.game_state = "game_over"
-            else:
-                levels = Level.get_level(self.current_level)
-                self.player.center_x, self.player.center_y = levels['player_start']
-        
-        rubles_hit_list = arcade.check_for_collision_with_list(self.player, self.rubless)
-        for rubles in rubles_hit_list:
-            rubles.remove_from_sprite_lists()
-            self.player.rubless += 1
-            self.player.score += 10
-
-        if arcade.check_for_collision(self.player, self.flag):
-            self.complete_level()
-        
-        emitters_to_remove = []
-        for emitter in self.emitters:
-            emitter.update()
-            if emitter.can_reap():
-                emitters_to_remove.append(emitter)
-        
-        self.update_camera()
-    
-    def create_burst_explosion(self, x, y):
-        colors = [
-            arcade.color.RED,
-            arcade.color.ORANGE_RED,
-            arcade.color.ORANGE,
-            arcade.color.YELLOW,
-            arcade.color.WHITE
-        ]
-        
-        for i, color in enumerate(colors):
-            particle_count = 15 - i * 3
-
-            emitter = arcade.particles.Emitter(
-                center_xy=(x, y),
-                emit_controller=arcade.particles.EmitBurst(particle_count),
-                particle_factory=lambda emitter, col=color: arcade.particles.FadeParticle(
-                    filename_or_texture=arcade.make_circle_texture(6 + i, col),
-                    change_xy=(
-                        random.uniform(-150, 150),
-                        random.uniform(-150, 150)
-                    ),
-                    lifetime=random.uniform(0.3, 0.7),
-                    scale=0.5 + i * 0.1,
-                    start_alpha=150 + i * 20
-                )
-            )
-            self.emitters.append(emitter)
+            if self.replay is not None:
+                self.replay.apply(world)
+            with profiler.scope("simulation"):
+                events = world.step()
+            with profiler.scope("events"):
+                self.telemetry.record_events(events, world.ticks)
+                for event, x, y in events:
+                    if event == simulation.PMC_DEFEATED:
+                        self.particles.create_burst_explosion(x, y)
+                    elif event == simulation.RESPAWN:
+                        self.previous_player_position = (x, y)
+            with profiler.scope("camera"):
+                self.update_camera()
+            
+            if self.replay is not None and self.replay.finished(world):
+                self.finish_replay()
+                break
+            if world.state == "game_over":
+                self.fail_level()
+            elif world.state == "level_complete":
+                self.complete_level()
+            if self.game_state != "playing":
+                self.finish_recording()
+                break
+        
+        if (self.game_state == "playing"
+                and world.elapsed_time - self.last_autosave >= AUTOSAVE_INTERVAL):
+            self.save_snapshot()
+        
+        with profiler.scope("particles"):
+            self.particles.update(delta_time)
+        
+        # The frame a level ends on is not a playing frame: it neither
+        # feeds the governor nor lets it change the quality (and the level's
+        # telemetry has already gone to the SaveWriter).
+        if self.game_state != "playing":
+            return
+        self.quality.add_update((time.perf_counter() - start) * 1000)
+        self.govern_quality(frame_time)
+    
+    def apply_quality(self):
+        settings = self.quality.settings
+        self.particles.set_quality(settings['particles'], settings['layers'])
+    
+    def govern_quality(self, delta_time):
+        # Quality changes go into the run's telemetry (see telemetry.py
+        # --event quality) and to stdout.
+        cost = self.quality.cost()
+        self.profiler.note("quality.cost", cost)
+        level = self.quality.adjust(delta_time)
+        if level is None:
+            return
+        self.apply_quality()
+        player = self.world.player
+        self.telemetry.record(self.gameplay.telemetry.QUALITY, self.world.ticks, player.center_x, player.center_y, level)
+        print(f"Качество графики: {self.quality.settings['name']} "
+              f"({cost:.1f} мс на кадр при бюджете {self.quality.budget_ms:.1f} мс)")
     
     def update_camera(self):
-        if not self.player or not self.camera:
+        if not self.world or not self.camera:
             return
         
-        target_center_x = self.player.center_x
-        target_center_y = self.player.center_y
-
-        current_center_x, current_center_y = self.camera.position
-
-        new_center_x = current_center_x + (target_center_x - current_center_x) * CAMERA_SPEED
-        new_center_y = current_center_y + (target_center_y - current_center_y) * CAMERA_SPEED
-
-        self.camera.position = (new_center_x, new_center_y)
+        # Same lerp replay.replay_headless uses, so replays stream the same
+        # chunks as the recorded run.
+        self.camera_x, self.camera_y = lerp_xy((self.camera_x, self.camera_y),
+                                               self.world.player.position, CAMERA_SPEED)
+        self.world.view_center = (self.camera_x, self.camera_y)
         
         self.camera.zoom = ZOOM_LEVEL
         
         
     def complete_level(self):
         self.game_state = "level_complete"
-        self.level_completion_time = time.time() - self.level_start_time
+        self.level_completion_time = self.world.elapsed_time
+        player = self.world.player
+        if self.generated_seed is not None:
+            return
 
-        self.db.save_level_result(
+        # The level is over, so its mid-level snapshot must not be resumed.
+        self.saves.delete_snapshot(self.player_name)
+        self.saves.save_level_result(
             self.player_name,
             self.current_level,
-            self.player.rubless,
-            self.pmcs_defeated,
+            player.rubless,
+            self.world.pmcs_defeated,
             self.level_completion_time,
-            self.player.score
+            player.score,
+            events=self.telemetry.copy()
         )
 
-        self.db.save_game(
+        self.saves.save_game(
             self.player_name,
             self.current_level + 1 if self.current_level < 3 else 3,
-            self.player.rubless,
-            self.player.score,
-            self.player.lives
+            player.rubless,
+            player.score,
+            player.lives
         )
+        
+        if self.current_level < 3:
+            self.preloader.start(self.current_level + 1)
+    
+    def fail_level(self):
+        # Failed runs are kept too (without a time), mostly for their events.
+        self.game_state = "game_over"
+        if self.generated_seed is not None:
+            return
+        # Resuming the autosave from just before the death would undo the
+        # game over.
+        self.saves.delete_snapshot(self.player_name)
+        player = self.world.player
+        self.saves.save_level_result(
+            self.player_name,
+            self.current_level,
+            player.rubless,
+            self.world.pmcs_defeated,
+            None,
+            player.score,
+            completed=False,
+            events=self.telemetry.copy()
+        )
+    
+    def finish_recording(self):
+        if self.recording is None:
+            return
+        self.recording.finish(self.world)
+        os.makedirs(self.record_dir, exist_ok=True)
+        self.recordings_saved += 1
+        name = time.strftime(f"level{self.current_level}-%Y%m%d-%H%M%S-{self.recordings_saved}.bgr")
+        path = os.path.join(self.record_dir, name)
+        self.recording.save(path)
+        self.recording = None
+        print(f"Запись сохранена: {path}")
+    
+    def start_replay(self, recording, speed=1.0):
+        # Plays a recorded run in the window; speed scales the simulation
+        # clock, and the catch-up cap is raised so fast replays lose no ticks.
+        replay = self.gameplay_modules().replay
+        self.setup_level(recording.level_num, replay.create_world(recording), recording.seed)
+        self.recording = None
+        self.camera_x, self.camera_y = recording.camera_start
+        self.previous_camera_position = recording.camera_start
+        self.replay = replay.ReplayInput(recording)
+        self.replay_speed = speed
+        self.timestep.max_steps = MAX_CATCH_UP_STEPS * max(1, math.ceil(speed))
+        self.game_state = "playing"
+    
+    def finish_replay(self):
+        recording = self.replay.recording
+        match = self.gameplay.replay.world_digest(self.world) == recording.digest
+        print(f"Повтор уровня {recording.level_num}: {self.world.ticks} тиков, "
+              f"{'совпадает' if match else 'РАСХОДИТСЯ'}")
+        self.stop_replay()
+    
+    def stop_replay(self):
+        self.replay = None
+        self.replay_speed = 1.0
+        self.timestep.max_steps = MAX_CATCH_UP_STEPS
+        self.game_state = "menu"
+    
+    def next_level(self):
+        level_num = self.current_level + 1
+        start = time.perf_counter()
+        with self.profiler.scope("level.transition"):
+            self.setup_level(level_num, self.preloader.take(level_num))
+        self.transition_time = (time.perf_counter() - start) * 1000
+        self.profiler.note("level.transition", self.transition_time)
     
     def on_key_press(self, key, modifiers):
+        if key == arcade.key.F3:
+            self.profiler.set_enabled(not self.profiler.enabled)
+            return
+        if key == arcade.key.F4:
+            self.export_profile()
+            return
+        
         if self.game_state == "menu":
             if key == arcade.key.KEY_1:
-                self.player = Player()
                 self.player_name = "Игрок"
                 self.setup_level(1)
                 self.game_state = "playing"
             elif key == arcade.key.KEY_2:
+                with self.profiler.scope("saves.flush"):
+                    self.saves.flush()
                 saved_game = self.db.load_game(self.player_name)
-                if saved_game:
-                    self.player = Player()
-                    self.player.rubless = saved_game['rubless']
-                    self.player.score = saved_game['score']
-                    self.player.lives = saved_game['lives']
+                snapshot = self.db.load_snapshot(self.player_name)
+                # A snapshot of an earlier level is stale: that level has
+                # been completed since.
+                if snapshot and (not saved_game or snapshot['level'] == saved_game['level']):
+                    self.load_snapshot(snapshot)
+                elif saved_game:
                     self.setup_level(saved_game['level'])
                     self.game_state = "playing"
+            elif key == arcade.key.KEY_3:
+                self.start_generated_level(random.randrange(10 ** 6))
             elif key == arcade.key.ESCAPE:
+                # close_window() does not go through on_close.
+                self.shut_down()
                 arcade.close_window()
         
         elif self.game_state == "playing":
-            if key == arcade.key.LEFT:
-                self.player.change_x = -PLAYER_MOVE_SPEED
-            elif key == arcade.key.RIGHT:
-                self.player.change_x = PLAYER_MOVE_SPEED
-            elif key == arcade.key.UP or key == arcade.key.SPACE:
-                if self.physics_engine.can_jump():
-                    self.player.change_y = PLAYER_JUMP_SPEED
+            if self.replay is not None:
+                if key == arcade.key.ESCAPE:
+                    self.stop_replay()
+            elif key in self.key_commands:
+                self.world.press(self.key_commands[key])
+                if self.recording is not None:
+                    self.recording.record(self.world.ticks, self.gameplay.replay.PRESS, self.key_commands[key])
+            elif key == arcade.key.F5:
+                self.save_snapshot()
+            elif key == arcade.key.F9:
+                with self.profiler.scope("saves.flush"):
+                    self.saves.flush()
+                snapshot = self.db.load_snapshot(self.player_name)
+                if snapshot:
+                    self.load_snapshot(snapshot)
             elif key == arcade.key.ESCAPE:
-                self.db.save_game(
-                    self.player_name,
-                    self.current_level,
-                    self.player.rubless,
-                    self.player.score,
-                    self.player.lives
-                )
+                self.finish_recording()
+                self.save_snapshot()
+                if self.generated_seed is None:
+                    player = self.world.player
+                    self.saves.save_game(
+                        self.player_name,
+                        self.current_level,
+                        player.rubless,
+                        player.score,
+                        player.lives
+                    )
                 self.game_state = "menu"
         
         elif self.game_state == "level_complete":
             if key == arcade.key.SPACE:
-                if self.current_level < 3:
-                    self.setup_level(self.current_level + 1)
+                if self.generated_seed is not None:
+                    self.start_generated_level(self.generated_seed + 1)
+                elif self.current_level < 3:
+                    self.next_level()
                     self.game_state = "playing"
                 else:
                     self.game_state = "menu"
             elif key == arcade.key.ESCAPE:
+                self.preloader.cancel()
                 self.game_state = "menu"
         
         elif self.game_state == "game_over":
             if key == arcade.key.SPACE:
-                self.player = Player()
                 self.setup_level(1)
                 self.game_state = "playing"
             elif key == arcade.key.ESCAPE:
                 self.game_state = "menu"
     
+    def export_profile(self):
+        path = time.strftime("trace_%Y%m%d_%H%M%S.json")
+        events = self.profiler.export_chrome_trace(path)
+        print(f"Профиль сохранен: {path} ({events} событий)")
+    
     def on_key_release(self, key, modifiers):
-        if self.game_state == "playing":
-            if key in (arcade.key.LEFT, arcade.key.RIGHT):
-                self.player.change_x = 0
-        
-        arcade.run()
\ No newline at end of file
+        if self.game_state == "playing" and self.replay is None:
+            if key in self.key_commands:
+                self.world.release(self.key_commands[key])
+                if self.recording is not None:
+                    self.recording.record(self.world.ticks, self.gameplay.replay.RELEASE, self.key_commands[key])
\ No newline at end of file
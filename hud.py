@@ -0,0 +1,148 @@
+import arcade
+import pyglet
+
+
+class Label:
+    # An arcade.Text that is only re-laid-out when the values fed into its
+    # template change.
+    def __init__(self, template, x, y, color, font_size, batch, anchor_x="left"):
+        self.template = template
+        self.values = None
+        self.text = arcade.Text(template, x, y, color, font_size,
+                                anchor_x=anchor_x, batch=batch)
+
+    def update(self, *values):
+        if values != self.values:
+            self.values = values
+            self.text.value = self.template.format(*values)
+
+    def set_visible(self, visible):
+        if self.text.label.visible != visible:
+            self.text.label.visible = visible
+
+
+class Screen:
+    # All labels of one screen share a pyglet batch and draw in one call.
+    def __init__(self):
+        self.batch = pyglet.graphics.Batch()
+        self.labels = {}
+
+    def add(self, name, template, x, y, color, font_size, anchor_x="left"):
+        label = Label(template, x, y, color, font_size, self.batch, anchor_x)
+        self.labels[name] = label
+        return label
+
+    def update(self, name, *values):
+        self.labels[name].update(*values)
+
+    def set_visible(self, name, visible):
+        self.labels[name].set_visible(visible)
+
+    def draw(self):
+        self.batch.draw()
+
+
+class HUD:
+    # Screens are built the first time they are needed (or by build_next()
+    # while the menu is idle): laying out their text renders glyphs, and
+    # only the menu has to be ready for the first frame.
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.screens = {}
+
+    def screen(self, name):
+        screen = self.screens.get(name)
+        if screen is None:
+            screen = Screen()
+            getattr(self, 'build_' + name)(screen, self.width // 2, self.height)
+            self.screens[name] = screen
+        return screen
+
+    def build_next(self):
+        # Builds one screen not built yet; False when there are none left.
+        for name in ('game', 'level_complete', 'game_over'):
+            if name not in self.screens:
+                self.screen(name)
+                return True
+        return False
+
+    def build_game(self, screen, center, height):
+        screen.add('level', "Уровень: {}", 10, height - 30, arcade.color.WHITE, 18)
+        screen.add('score', "Очки: {}", 10, height - 60, arcade.color.WHITE, 18)
+        screen.add('rubless', "Монеты: {}", 10, height - 90, arcade.color.WHITE, 18)
+        screen.add('lives', "Жизни: {}", 10, height - 120, arcade.color.WHITE, 18)
+        screen.add('time', "Время: {} сек", self.width - 150, height - 30, arcade.color.WHITE, 18)
+        screen.add('quality', "Графика: {}", self.width - 150, height - 55, arcade.color.LIGHT_GRAY, 12)
+
+    def build_level_complete(self, screen, center, height):
+        screen.add('title', "УРОВЕНЬ ПРОЙДЕН!", center, height - 100,
+                   arcade.color.GOLD, 36, "center")
+        screen.add('level', "Уровень: {}", center, height - 180,
+                   arcade.color.WHITE, 24, "center")
+        screen.add('rubless', "Собрано монет: {}", center, height - 220,
+                   arcade.color.WHITE, 24, "center")
+        screen.add('pmcs', "Побеждено врагов: {}", center, height - 260,
+                   arcade.color.WHITE, 24, "center")
+        screen.add('time', "Время прохождения: {} сек", center, height - 300,
+                   arcade.color.WHITE, 24, "center")
+        screen.add('score', "Итоговые очки: {}", center, height - 340,
+                   arcade.color.GOLD, 28, "center")
+        screen.add('next', "Нажмите SPACE для следующего уровня", center, height - 400,
+                   arcade.color.BLACK, 20, "center")
+        screen.add('finished', "ИГРА ПРОЙДЕНА! Нажмите SPACE для меню", center, height - 400,
+                   arcade.color.GOLD, 20, "center")
+        screen.add('escape', "Нажмите ESC для сохранения и выхода в меню", center, height - 450,
+                   arcade.color.BLACK, 18, "center")
+
+    def build_menu(self, screen, center, height):
+        screen.add('title', "Bugilla!", center, height - 100, arcade.color.BLACK, 36, "center")
+        screen.add('player', "Игрок: {}", center, height - 180, arcade.color.DARK_BLUE, 24, "center")
+        screen.add('save', "Сохранение: Уровень {}, Очки: {}", center, height - 220,
+                   arcade.color.BLUE, 18, "center")
+        screen.add('new_game', "1 - Новая игра", center, height - 280, arcade.color.BLACK, 24, "center")
+        screen.add('load_game', "2 - Загрузить игру", center, height - 320, arcade.color.BLACK, 24, "center")
+        screen.add('generated', "3 - Случайный уровень", center, height - 360, arcade.color.BLACK, 24, "center")
+        screen.add('exit', "ESC - Выход", center, height - 400, arcade.color.BLACK, 24, "center")
+
+    def build_game_over(self, screen, center, height):
+        screen.add('title', "GAME OVER", center, height - 100, arcade.color.RED, 48, "center")
+        screen.add('score', "Ваш счет: {}", center, height - 180, arcade.color.WHITE, 28, "center")
+        screen.add('restart', "Нажмите SPACE для новой игры", center, height - 250,
+                   arcade.color.GREEN, 24, "center")
+        screen.add('escape', "Нажмите ESC для выхода в меню", center, height - 300,
+                   arcade.color.LIGHT_GRAY, 20, "center")
+
+    def draw_game(self, level, score, rubless, lives, seconds, quality):
+        screen = self.screen('game')
+        screen.update('level', level)
+        screen.update('score', score)
+        screen.update('rubless', rubless)
+        screen.update('lives', lives)
+        screen.update('time', seconds)
+        screen.update('quality', quality)
+        screen.draw()
+
+    def draw_level_complete(self, level, rubless, pmcs_defeated, seconds, score, last_level):
+        screen = self.screen('level_complete')
+        screen.update('level', level)
+        screen.update('rubless', rubless)
+        screen.update('pmcs', pmcs_defeated)
+        screen.update('time', seconds)
+        screen.update('score', score)
+        screen.set_visible('next', not last_level)
+        screen.set_visible('finished', last_level)
+        screen.draw()
+
+    def draw_menu(self, player_name, saved_game):
+        screen = self.screen('menu')
+        screen.update('player', player_name)
+        if saved_game:
+            screen.update('save', saved_game['level'], saved_game['score'])
+        screen.set_visible('save', bool(saved_game))
+        screen.draw()
+
+    def draw_game_over(self, score):
+        screen = self.screen('game_over')
+        screen.update('score', score)
+        screen.draw()
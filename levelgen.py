@@ -0,0 +1,150 @@
+import argparse
+import json
+import random
+import shutil
+import tempfile
+import time
+
+from simulation import GRAVITY, PLAYER_JUMP_SPEED, PLAYER_MOVE_SPEED
+
+# Jump envelope of the player, from the physics constants: the peak of a
+# jump and the distance covered while rising and falling back to the same
+# height. Gaps and steps stay well inside it so every level is playable.
+JUMP_HEIGHT = sum(range(PLAYER_JUMP_SPEED - GRAVITY, 0, -GRAVITY))
+JUMP_DISTANCE = PLAYER_MOVE_SPEED * 2 * PLAYER_JUMP_SPEED // GRAVITY
+MAX_RISE = JUMP_HEIGHT * 0.5
+MAX_GAP = JUMP_DISTANCE * 0.5
+
+PLATFORM_HEIGHT = 20
+MIN_PLATFORM_WIDTH = 100
+MAX_PLATFORM_WIDTH = 300
+MIN_Y = 50
+MAX_Y = 550
+PMC_HEIGHT_ABOVE = 25
+PMC_MIN_WIDTH = 150
+FLAG_HEIGHT_ABOVE = 22
+
+START_PLATFORM = (0, 100, 300, PLATFORM_HEIGHT)
+PLAYER_START = (50, 150)
+
+BACKGROUND_COLORS = [
+    (135, 206, 235),
+    (70, 70, 70),
+    (173, 216, 230),
+]
+
+
+def iter_level(seed=0, platforms=100, rubles_density=1.0, pmc_density=0.3, spacing=1.0):
+    # Yields (kind, entry) for one level in the Level.get_level schema, left
+    # to right, without ever holding the whole level: platforms, rubles and
+    # PMCs as they are placed, then the flag last. Platforms form one chain
+    # of jumps from the start platform to the flag.
+    #   platforms: platform count
+    #   rubles_density: average rubles per platform
+    #   pmc_density: average PMCs per platform wide enough to patrol
+    #   spacing: 0..1, how much of the safe jump distance gaps may use
+    rng = random.Random(seed)
+    max_gap = 20 + (MAX_GAP - 20) * min(max(spacing, 0.0), 1.0)
+    x, y, width, height = START_PLATFORM
+    for i in range(max(1, platforms)):
+        if i:
+            x = x + width + rng.uniform(20, max_gap)
+            y = min(max(y + rng.uniform(-MAX_RISE, MAX_RISE), MIN_Y), MAX_Y)
+            width = rng.uniform(MIN_PLATFORM_WIDTH, MAX_PLATFORM_WIDTH)
+        top = y + height
+        yield 'platforms', (x, y, width, height)
+
+        for _ in range(_amount(rng, rubles_density)):
+            yield 'rubless', (x + rng.uniform(10, width - 10), top + rng.uniform(10, MAX_RISE))
+
+        # Nothing patrols the start platform.
+        if i and width >= PMC_MIN_WIDTH:
+            for _ in range(_amount(rng, pmc_density)):
+                left = x + 10
+                right = x + width - 10
+                yield 'pmcs', (rng.uniform(left, right), top + PMC_HEIGHT_ABOVE, left, right)
+    yield 'flag', (x + width - 50, top + FLAG_HEIGHT_ABOVE)
+
+
+def _amount(rng, density):
+    # density 1.7 -> 1 or 2, averaging 1.7
+    whole = int(density)
+    return whole + (1 if rng.random() < density - whole else 0)
+
+
+def generate_level(seed=0, name=None, **options):
+    level = {
+        'name': name or f"Случайный уровень {seed}",
+        'platforms': [],
+        'rubless': [],
+        'pmcs': [],
+        'flag': None,
+        'player_start': PLAYER_START,
+        'background_color': BACKGROUND_COLORS[seed % len(BACKGROUND_COLORS)],
+    }
+    for kind, entry in iter_level(seed, **options):
+        if kind == 'flag':
+            level['flag'] = entry
+        else:
+            level[kind].append(entry)
+    return level
+
+
+def write_level(path, seed=0, name=None, **options):
+    # Streams a generated level to a JSON file for levels.LevelLoader. Each
+    # object list is spilled to its own temporary file as it is generated
+    # and the three are stitched together at the end, so memory stays flat
+    # whatever the size. Returns the object counts.
+    counts = {'platforms': 0, 'rubless': 0, 'pmcs': 0}
+    spills = {kind: tempfile.TemporaryFile('w+', encoding='utf-8') for kind in counts}
+    flag = None
+    try:
+        for kind, entry in iter_level(seed, **options):
+            if kind == 'flag':
+                flag = entry
+                continue
+            spill = spills[kind]
+            spill.write(",\n    [" if counts[kind] else "\n    [")
+            spill.write(", ".join(["%.2f" % value for value in entry]))
+            spill.write("]")
+            counts[kind] += 1
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('{\n  "name": %s,\n' % json.dumps(name or f"Случайный уровень {seed}", ensure_ascii=False))
+            for kind, spill in spills.items():
+                f.write(f'  "{kind}": [')
+                spill.seek(0)
+                shutil.copyfileobj(spill, f)
+                f.write("\n  ],\n")
+            f.write(f'  "flag": {json.dumps([round(value, 2) for value in flag])},\n')
+            f.write(f'  "player_start": {json.dumps(list(PLAYER_START))},\n')
+            f.write(f'  "background_color": {json.dumps(list(BACKGROUND_COLORS[seed % len(BACKGROUND_COLORS)]))}\n')
+            f.write("}\n")
+    finally:
+        for spill in spills.values():
+            spill.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a level file")
+    parser.add_argument("output")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--platforms", type=int, default=100)
+    parser.add_argument("--rubles-density", type=float, default=1.0)
+    parser.add_argument("--pmc-density", type=float, default=0.3)
+    parser.add_argument("--spacing", type=float, default=1.0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = write_level(args.output, args.seed, platforms=args.platforms,
+                         rubles_density=args.rubles_density, pmc_density=args.pmc_density,
+                         spacing=args.spacing)
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    print(f"{args.output}: {counts['platforms']} platforms, {counts['rubless']} rubles, "
+          f"{counts['pmcs']} PMCs in {elapsed:.2f} s ({total / elapsed:.0f} objects/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,95 +1,285 @@
+import glob
+import hashlib
+import json
+import os
+import struct
+import sys
+from array import array
+
+from enemies import BEHAVIORS
+
+LEVEL_DIR = "assets/levels"
+CACHE_DIR = "__cache__"
+LEVEL_FILE = "level{}.json"
+
+# Compiled cache layout: header, level name, fixed fields, then the object
+# tables as little-endian float64 arrays and one behaviour byte per PMC.
+CACHE_MAGIC = b"BGLV"
+CACHE_VERSION = 1
+CACHE_HEADER = struct.Struct('<4sH32sIII')
+CACHE_NAME = struct.Struct('<H')
+CACHE_FIXED = struct.Struct('<4d3B')
+
+# Digests of the last few levels fingerprinted, as [(level, digest)]:
+# hashing a level costs far more than a snapshot capture.
+DIGEST_CACHE_SIZE = 4
+digest_cache = []
+
+BEHAVIOR_NAMES = {code: name for name, code in BEHAVIORS.items()}
+
+FIELDS = {
+    # key: (items per entry, is a list of entries)
+    'platforms': (4, True),
+    'rubless': (2, True),
+    'pmcs': (4, True),
+    'flag': (2, False),
+    'player_start': (2, False),
+    'background_color': (3, False),
+}
+
+
+class LevelError(ValueError):
+    pass
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_level(data, source):
+    if not isinstance(data, dict):
+        raise LevelError(f"{source}: уровень должен быть объектом JSON")
+    if not isinstance(data.get('name'), str):
+        raise LevelError(f"{source}: name: нужна строка")
+
+    for key, (size, is_list) in FIELDS.items():
+        if key not in data:
+            raise LevelError(f"{source}: нет поля {key}")
+        entries = data[key] if is_list else [data[key]]
+        if not isinstance(entries, list):
+            raise LevelError(f"{source}: {key}: нужен список")
+        for i, entry in enumerate(entries):
+            where = f"{key}[{i}]" if is_list else key
+            extra = 1 if key == 'pmcs' else 0
+            if not isinstance(entry, list) or not size <= len(entry) <= size + extra:
+                raise LevelError(f"{source}: {where}: нужно {size} чисел")
+            if not all(is_number(value) for value in entry[:size]):
+                raise LevelError(f"{source}: {where}: нужно {size} чисел")
+
+    for i, (x, y, width, height) in enumerate(data['platforms']):
+        if width <= 0 or height <= 0:
+            raise LevelError(f"{source}: platforms[{i}]: размеры должны быть положительными")
+    for i, pmc in enumerate(data['pmcs']):
+        if pmc[2] > pmc[3]:
+            raise LevelError(f"{source}: pmcs[{i}]: левая граница правее правой")
+        if len(pmc) == 5 and pmc[4] not in BEHAVIORS:
+            raise LevelError(f"{source}: pmcs[{i}]: неизвестное поведение {pmc[4]!r}")
+    if not all(isinstance(c, int) and 0 <= c <= 255 for c in data['background_color']):
+        raise LevelError(f"{source}: background_color: нужны три числа 0-255")
+
+
+def level_digest(level):
+    # Short fingerprint of the level data, so replays and snapshots notice
+    # when the level they were taken on has changed.
+    for cached, digest in digest_cache:
+        if cached is level:
+            return digest
+    digest = hashlib.sha256(repr(sorted(level.items())).encode('utf-8')).digest()[:8]
+    digest_cache.insert(0, (level, digest))
+    del digest_cache[DIGEST_CACHE_SIZE:]
+    return digest
+
+
+def compile_level(data, digest):
+    platforms = array('d')
+    for entry in data['platforms']:
+        platforms.extend(entry)
+    rubless = array('d')
+    for entry in data['rubless']:
+        rubless.extend(entry)
+    pmcs = array('d')
+    behaviors = bytearray()
+    for entry in data['pmcs']:
+        pmcs.extend(entry[:4])
+        behaviors.append(BEHAVIORS[entry[4]] if len(entry) == 5 else BEHAVIORS['patrol'])
+
+    name = data['name'].encode('utf-8')
+    parts = [
+        CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, digest,
+                          len(data['platforms']), len(data['rubless']), len(data['pmcs'])),
+        CACHE_NAME.pack(len(name)),
+        name,
+        CACHE_FIXED.pack(*data['flag'], *data['player_start'], *data['background_color']),
+    ]
+    for table in (platforms, rubless, pmcs):
+        if sys.byteorder == 'big':
+            table.byteswap()
+        parts.append(table.tobytes())
+    parts.append(bytes(behaviors))
+    return b"".join(parts)
+
+
+def read_table(blob, offset, count, width):
+    table = array('d')
+    size = count * width * 8
+    table.frombytes(blob[offset:offset + size])
+    if sys.byteorder == 'big':
+        table.byteswap()
+    values = iter(table.tolist())
+    return list(zip(*[values] * width)), offset + size
+
+
+def decompile_level(blob, digest):
+    # Returns None when the blob is not a cache of this exact file.
+    if len(blob) < CACHE_HEADER.size:
+        return None
+    magic, version, blob_digest, n_platforms, n_rubless, n_pmcs = CACHE_HEADER.unpack_from(blob)
+    if magic != CACHE_MAGIC or version != CACHE_VERSION or blob_digest != digest:
+        return None
+
+    offset = CACHE_HEADER.size
+    (name_length,) = CACHE_NAME.unpack_from(blob, offset)
+    offset += CACHE_NAME.size
+    name = blob[offset:offset + name_length].decode('utf-8')
+    offset += name_length
+    fixed = CACHE_FIXED.unpack_from(blob, offset)
+    offset += CACHE_FIXED.size
+
+    platforms, offset = read_table(blob, offset, n_platforms, 4)
+    rubless, offset = read_table(blob, offset, n_rubless, 2)
+    pmcs, offset = read_table(blob, offset, n_pmcs, 4)
+    behaviors = blob[offset:offset + n_pmcs]
+    if len(behaviors) != n_pmcs:
+        return None
+    patrol = BEHAVIORS['patrol']
+    pmcs = [pmc if code == patrol else pmc + (BEHAVIOR_NAMES[code],)
+            for pmc, code in zip(pmcs, behaviors)]
+
+    return {
+        'name': name,
+        'platforms': platforms,
+        'rubless': rubless,
+        'pmcs': pmcs,
+        'flag': fixed[0:2],
+        'player_start': fixed[2:4],
+        'background_color': fixed[4:7],
+    }
+
+
+class LevelLoader:
+    # Level files are JSON under assets/levels. The first load validates the
+    # file and compiles it into a binary cache named by the file's hash, in a
+    # __cache__ directory next to it; later runs read the cache instead.
+    # Loaded levels are memoized, so the returned dicts are shared and must
+    # be treated as read-only.
+    def __init__(self):
+        self.levels = {}
+        self.graphs = {}
+        self.parses = 0
+        self.cache_loads = 0
+
+    def cache_path(self, path, digest):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(os.path.dirname(path), CACHE_DIR, f"{stem}-{digest.hex()[:16]}.bin")
+
+    def load(self, path):
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = self.levels.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        with open(path, 'rb') as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).digest()
+        cache_path = self.cache_path(path, digest)
+
+        level = None
+        if os.path.exists(cache_path):
+            with open(cache_path, 'rb') as f:
+                level = decompile_level(f.read(), digest)
+            if level is not None:
+                self.cache_loads += 1
+        if level is None:
+            level = self.parse(path, raw, digest, cache_path)
+
+        self.levels[path] = (key, level)
+        return level
+
+    def parse(self, path, raw, digest, cache_path):
+        try:
+            data = json.loads(raw.decode('utf-8'))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise LevelError(f"{path}: {e}") from e
+        validate_level(data, path)
+        self.parses += 1
+
+        blob = compile_level(data, digest)
+        self.write_cache(path, cache_path, blob)
+        # Decode the blob just built, so a fresh parse and a cache hit hand
+        # out identical dicts (floats and tuples).
+        return decompile_level(blob, digest)
+
+    def write_cache(self, path, cache_path, blob):
+        # A missing cache only costs a re-parse, so a read-only install is fine.
+        try:
+            cache_dir = os.path.dirname(cache_path)
+            os.makedirs(cache_dir, exist_ok=True)
+            stem = os.path.splitext(os.path.basename(path))[0]
+            for stale in glob.glob(os.path.join(cache_dir, f"{stem}-*.bin")):
+                os.remove(stale)
+            temp_path = cache_path + ".tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(blob)
+            os.replace(temp_path, cache_path)
+        except OSError:
+            pass
+
+    def level_path(self, level_num):
+        return os.path.join(LEVEL_DIR, LEVEL_FILE.format(level_num))
+
+    def get_level(self, level_num):
+        path = self.level_path(level_num)
+        if not os.path.exists(path):
+            path = self.level_path(1)
+        return self.load(path)
+
+    def reachability(self, path):
+        # The level's reachability.LevelGraph, built on first use and kept
+        # for as long as the memoized level itself.
+        from reachability import LevelGraph
+
+        level = self.load(path)
+        cached = self.graphs.get(path)
+        if cached is not None and cached[0] is level:
+            return cached[1]
+        graph = LevelGraph(level)
+        self.graphs[path] = (level, graph)
+        return graph
+
+    def check(self, path):
+        # Raises LevelError when some rubles or the flag cannot be reached.
+        graph = self.reachability(path)
+        missing = graph.unreachable()
+        if missing:
+            from reachability import REPORT_LIMIT
+
+            names = ", ".join(missing[:REPORT_LIMIT])
+            if len(missing) > REPORT_LIMIT:
+                names += f" и еще {len(missing) - REPORT_LIMIT}"
+            raise LevelError(f"{path}: недостижимы: {names}")
+        return graph
+
+    def clear(self):
+        self.levels.clear()
+        self.graphs.clear()
+
+
+LEVELS = LevelLoader()
+
+
 class Level:
-    
+
     @staticmethod
     def get_level(level_num):
-        levels = {
-            1: {
-                'name': 'Небесный дэнс',
-                'platforms': [
-                    # (x, y, width, height)
-                    (0, 100, 800, 20),
-                    (100, 200, 100, 20),
-                    (250, 300, 100, 20),
-                    (400, 250, 100, 20),
-                    (550, 200, 100, 20),
-                    (700, 300, 100, 20),
-                    (300, 150, 100, 20),
-                    (600, 100, 100, 20),
-                ],
-                'rubless': [
-                    # (x, y)
-                    (135, 230),
-                    (380, 180),
-                    (280, 330),
-                    (650, 250),
-                    (750, 350),
-                ],
-                'pmcs': [
-                    # (x, y, move_left, move_right)
-                    (400, 295, 410, 490),
-                    (200, 145, 150, 250),
-                    (500, 145, 450, 550),
-                ],
-                'flag': (750, 342),
-                'player_start': (50, 150),
-                'background_color': (135, 206, 235),
-            },
-            2: {
-                'name': 'Дом родной',
-                'platforms': [
-                    (0, 50, 200, 20),
-                    (250, 100, 150, 20),
-                    (150, 200, 100, 20),
-                    (400, 150, 100, 20),
-                    (550, 250, 100, 20),
-                    (300, 300, 150, 20),
-                    (650, 350, 150, 20),
-                    (200, 450, 100, 20),
-                ],
-                'rubless': [
-                    (125, 250),
-                    (275, 150),
-                    (350, 350),
-                    (450, 200),
-                    (575, 300),
-                    (225, 500),
-                ],
-                'pmcs': [
-                    (300, 145, 250, 350),
-                    (600, 295, 550, 650),
-                ],
-                'flag': (700, 390),
-                'player_start': (50, 100),
-                'background_color': (70, 70, 70),
-            },
-            3: {
-                'name': 'Небесный дэнс 2',
-                'platforms': [
-                    (0, 100, 150, 20),
-                    (200, 200, 100, 20),
-                    (335, 300, 150, 20),
-                    (550, 250, 100, 20),
-                    (400, 80, 100, 20),
-                    (150, 400, 100, 20),
-                    (650, 350, 150, 20),
-                    (500, 450, 100, 20),
-                ],
-                'rubless': [
-                    (120, 150),
-                    (225, 250),
-                    (375, 350),
-                    (425, 125),
-                    (575, 300),
-                    (525, 500),
-                ],
-                'pmcs': [
-                    (400, 125, 410, 490),
-                    (340, 345, 355, 500),
-                ],
-                'flag': (700, 390),
-                'player_start': (50, 150),
-                'background_color': (173, 216, 230),
-            }
-        }
-        
-        return levels.get(level_num, levels[1])
\ No newline at end of file
+        return LEVELS.get_level(level_num)
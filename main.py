@@ -1,12 +1,63 @@
+import time
+
+# Taken before the heavy imports, so --startup counts them too.
+STARTED = time.perf_counter()
+
+import argparse
+
 import arcade
 from game import GameWindow
 
 
+def measure_startup(window, imported, created, set_up):
+    # --startup: runs frames by hand at 60 fps, like arcade.run, until the
+    # first frame is drawn and the background startup work is done, then
+    # prints where the time went.
+    frame_time = 1 / 60
+    delta_time = frame_time
+    last_time = time.perf_counter()
+    while window.first_frame_time is None or not window.startup_finished():
+        window.dispatch_events()
+        window.on_update(delta_time)
+        window.on_draw()
+        window.flip()
+        now = time.perf_counter()
+        time.sleep(max(0.0, frame_time - (now - last_time)))
+        now = time.perf_counter()
+        delta_time, last_time = now - last_time, now
+    finished = time.perf_counter()
+    print(f"imports:        {(imported - STARTED) * 1000:8.1f} ms")
+    print(f"window:         {(created - imported) * 1000:8.1f} ms")
+    print(f"setup:          {(set_up - created) * 1000:8.1f} ms")
+    print(f"first frame:    {(window.first_frame_time - STARTED) * 1000:8.1f} ms after start")
+    print(f"startup done:   {(finished - STARTED) * 1000:8.1f} ms after start "
+          f"(database, music, gameplay modules, textures, HUD)")
+    window.on_close()
+
+
 def main():
+    imported = time.perf_counter()
+    parser = argparse.ArgumentParser(description="Bugilla!")
+    parser.add_argument("--record", metavar="DIR", help="save every level run to DIR as a replay file")
+    parser.add_argument("--replay", metavar="FILE", help="play back a recorded run")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed (default 1.0)")
+    parser.add_argument("--startup", action="store_true",
+                        help="print the time to the first frame and exit")
+    args = parser.parse_args()
+
     window = GameWindow()
+    created = time.perf_counter()
+    window.record_dir = args.record
     window.setup()
+    set_up = time.perf_counter()
+    if args.replay:
+        from replay import Recording
+        window.start_replay(Recording.load(args.replay), args.speed)
+    if args.startup:
+        measure_startup(window, imported, created, set_up)
+        return
     arcade.run()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,101 @@
+import threading
+import time
+
+from textures import TEXTURES
+
+
+class LevelPreloader:
+    # Builds the next level's world on a background thread while the results
+    # screen is showing, so switching levels only swaps in ready objects.
+    # build(level_num) must not touch the GL context; Simulation keeps its
+    # sprite lists lazy for this.
+    def __init__(self, build):
+        self.build = build
+        self.lock = threading.Lock()
+        self.level_num = None
+        self.thread = None
+        self.world = None
+        self.error = None
+        self.build_time = 0.0
+
+    def start(self, level_num):
+        self.cancel()
+        self.level_num = level_num
+        self.thread = threading.Thread(target=self._run, args=(level_num,),
+                                       name="level-preloader", daemon=True)
+        self.thread.start()
+
+    def _run(self, level_num):
+        start = time.perf_counter()
+        world = error = None
+        try:
+            TEXTURES.preload()
+            world = self.build(level_num)
+        except Exception as e:
+            error = e
+        with self.lock:
+            # Still the current job: hand the result over.
+            if self.thread is threading.current_thread():
+                self.world, self.error = world, error
+                self.build_time = time.perf_counter() - start
+                return
+        # Cancelled while building: nobody will take this world.
+        if world is not None:
+            world.close()
+
+    def ready(self):
+        return self.thread is not None and not self.thread.is_alive()
+
+    def take(self, level_num):
+        # The preloaded world for level_num, waiting for the thread if it is
+        # still building, or None if nothing was preloaded for that level.
+        if self.thread is None or self.level_num != level_num:
+            return None
+        self.thread.join()
+        world, error = self.world, self.error
+        self.thread = None
+        self.level_num = None
+        self.world = None
+        self.error = None
+        if error is not None:
+            raise error
+        return world
+
+    def cancel(self):
+        # Never waits: a job still building closes its own world when done.
+        with self.lock:
+            world = self.world
+            self.thread = None
+            self.level_num = None
+            self.world = None
+            self.error = None
+        if world is not None:
+            world.close()
+
+
+class BackgroundTask:
+    # Runs function() once on a daemon thread. result() waits for it and
+    # returns its value, or raises what it raised; ready() never blocks.
+    def __init__(self, function, name="background-task"):
+        self.value = None
+        self.error = None
+        self.elapsed = 0.0
+        self.thread = threading.Thread(target=self._run, args=(function,), name=name, daemon=True)
+        self.thread.start()
+
+    def _run(self, function):
+        start = time.perf_counter()
+        try:
+            self.value = function()
+        except Exception as e:
+            self.error = e
+        self.elapsed = time.perf_counter() - start
+
+    def ready(self):
+        return not self.thread.is_alive()
+
+    def result(self):
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.value
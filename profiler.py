@@ -0,0 +1,195 @@
+import json
+import time
+from contextlib import nullcontext
+
+import arcade
+
+from hud import Screen
+
+FRAME_CAPACITY = 300
+TARGET_FRAME_MS = 1000 / 60
+
+# Handed out by scope() while profiling is off, so a disabled scope costs
+# one attribute check and an empty with-block.
+NULL_SCOPE = nullcontext()
+
+
+class Scope:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.depth += 1
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        profiler = self.profiler
+        profiler.depth -= 1
+        profiler.samples.append((self.name, self.start, end - self.start, profiler.depth))
+
+
+class Profiler:
+    # Named timing scopes grouped into frames. The last FRAME_CAPACITY
+    # frames are kept in a ring buffer; each one is
+    # (start, duration, [(name, start, duration, depth), ...]).
+    def __init__(self, capacity=FRAME_CAPACITY):
+        self.enabled = False
+        self.capacity = capacity
+        self.frames = [None] * capacity
+        self.next_frame = 0
+        self.frame_count = 0
+        self.frame_start = None
+        self.samples = []
+        self.depth = 0
+        # Running per-scope sums over the buffered frames, for the overlay.
+        self.totals = {}
+        # Latest value of one-off timings (level switches and the like) that
+        # are too rare to show up in a per-frame average. Always recorded.
+        self.notes = {}
+
+    def scope(self, name):
+        if not self.enabled:
+            return NULL_SCOPE
+        return Scope(self, name)
+
+    def frame(self):
+        # Called once per drawn frame: closes the previous frame and opens a
+        # new one, so a frame's duration is the full interval between draws.
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            # Scopes are appended as they close; store them by start time so
+            # parents come before their children.
+            self.samples.sort(key=lambda sample: sample[1])
+            self.account(self.frames[self.next_frame], -1)
+            frame = (self.frame_start, now - self.frame_start, self.samples)
+            self.account(frame, 1)
+            self.frames[self.next_frame] = frame
+            self.next_frame = (self.next_frame + 1) % self.capacity
+            self.frame_count = min(self.frame_count + 1, self.capacity)
+        self.frame_start = now
+        self.samples = []
+
+    def account(self, frame, sign):
+        if frame is None:
+            return
+        totals = self.totals
+        for name, _, duration, depth in frame[2]:
+            if name in totals:
+                totals[name][1] += duration * sign
+            else:
+                totals[name] = [depth, duration]
+
+    def note(self, name, milliseconds):
+        self.notes[name] = milliseconds
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        self.frame_start = None
+        self.samples = []
+        self.depth = 0
+
+    def clear(self):
+        self.frames = [None] * self.capacity
+        self.next_frame = 0
+        self.frame_count = 0
+        self.totals = {}
+
+    def recorded_frames(self):
+        # Oldest first.
+        start = (self.next_frame - self.frame_count) % self.capacity
+        for i in range(self.frame_count):
+            yield self.frames[(start + i) % self.capacity]
+
+    def frame_times(self):
+        return [duration * 1000 for _, duration, _ in self.recorded_frames()]
+
+    def breakdown(self):
+        # Average milliseconds per frame for every scope, in first-seen order,
+        # as (name, depth, ms) tuples.
+        if not self.frame_count:
+            return []
+        return [(name, depth, total * 1000 / self.frame_count)
+                for name, (depth, total) in self.totals.items()]
+
+    def export_chrome_trace(self, path):
+        # Chrome trace / Perfetto JSON: complete ("X") events in microseconds.
+        events = []
+        origin = None
+        for frame_start, frame_duration, samples in self.recorded_frames():
+            if origin is None:
+                origin = frame_start
+            events.append({'name': 'frame', 'ph': 'X', 'pid': 1, 'tid': 1,
+                           'ts': (frame_start - origin) * 1e6, 'dur': frame_duration * 1e6})
+            for name, start, duration, depth in samples:
+                events.append({'name': name, 'ph': 'X', 'pid': 1, 'tid': 1,
+                               'ts': (start - origin) * 1e6, 'dur': duration * 1e6,
+                               'args': {'depth': depth}})
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return len(events)
+
+
+class ProfilerOverlay:
+    # Frame-time graph plus a per-scope breakdown, drawn in screen space.
+    GRAPH_WIDTH = 300
+    GRAPH_HEIGHT = 80
+    GRAPH_MAX_MS = 50
+    ROW_HEIGHT = 16
+
+    def __init__(self, profiler, x, y):
+        self.profiler = profiler
+        self.x = x
+        self.y = y
+        self.screen = Screen()
+        self.screen.add('frame', "Кадр: {:.2f} мс (макс {:.2f})", x, y + self.GRAPH_HEIGHT + 6,
+                        arcade.color.WHITE, 10)
+        self.rows = []
+
+    def row(self, index):
+        while len(self.rows) <= index:
+            name = f"row{len(self.rows)}"
+            self.screen.add(name, "{}{}: {:.2f} мс", self.x, self.y - (len(self.rows) + 1) * self.ROW_HEIGHT,
+                            arcade.color.WHITE, 10)
+            self.rows.append(name)
+        return self.rows[index]
+
+    def draw(self):
+        x, y = self.x, self.y
+        width, height = self.GRAPH_WIDTH, self.GRAPH_HEIGHT
+        breakdown = self.profiler.breakdown()
+        breakdown += [(name, 0, ms) for name, ms in self.profiler.notes.items()]
+        rows_height = (len(breakdown) + 1) * self.ROW_HEIGHT
+        arcade.draw_lrbt_rectangle_filled(x - 4, x + width + 4, y - rows_height - 4, y + height + 22,
+                                          (0, 0, 0, 170))
+
+        target_y = y + TARGET_FRAME_MS / self.GRAPH_MAX_MS * height
+        arcade.draw_line(x, target_y, x + width, target_y, arcade.color.GREEN, 1)
+
+        times = self.profiler.frame_times()
+        if len(times) > 1:
+            step = width / (self.profiler.capacity - 1)
+            points = [(x + i * step, y + min(ms, self.GRAPH_MAX_MS) / self.GRAPH_MAX_MS * height)
+                      for i, ms in enumerate(times)]
+            arcade.draw_line_strip(points, arcade.color.YELLOW, 1)
+            self.screen.update('frame', sum(times) / len(times), max(times))
+        else:
+            self.screen.update('frame', 0, 0)
+
+        for i, (name, depth, ms) in enumerate(breakdown):
+            row = self.row(i)
+            self.screen.update(row, "  " * depth, name, ms)
+            self.screen.set_visible(row, True)
+        for row in self.rows[len(breakdown):]:
+            self.screen.set_visible(row, False)
+        self.screen.draw()
+
+
+# Shared by the window and the headless Simulation, which has no reference
+# to the window.
+PROFILER = Profiler()
@@ -0,0 +1,89 @@
+from profiler import TARGET_FRAME_MS
+
+# Lowest first. particles: share of each burst's particles that are
+# emitted; layers: how many of the burst's colored layers are emitted;
+# animation: speed of sprite animations relative to normal.
+QUALITY_LEVELS = [
+    {'name': "низкое", 'particles': 0.25, 'layers': 2, 'animation': 0.5},
+    {'name': "среднее", 'particles': 0.5, 'layers': 3, 'animation': 0.75},
+    {'name': "высокое", 'particles': 1.0, 'layers': 5, 'animation': 1.0},
+]
+
+# Weight of the newest frame in the moving averages. Samples are capped at
+# SPIKE_LIMIT frame budgets, so a one-off hitch (a level loading, a chunk
+# streaming in) cannot drag the level down on its own.
+SMOOTHING = 0.05
+SPIKE_LIMIT = 2.0
+# Drop a level once update + draw has cost more than DOWNGRADE_AT of the
+# frame budget for DOWNGRADE_DELAY seconds in a row; go back up after
+# UPGRADE_DELAY seconds under UPGRADE_AT. The gap between the two keeps
+# the level from flapping.
+DOWNGRADE_AT = 0.9
+UPGRADE_AT = 0.5
+DOWNGRADE_DELAY = 0.5
+UPGRADE_DELAY = 3.0
+# A level that gets dropped again within PROBATION seconds of going up
+# waits twice as long before the next try, up to MAX_UPGRADE_DELAY.
+PROBATION = 5.0
+MAX_UPGRADE_DELAY = 60.0
+
+
+class QualityGovernor:
+    # Keeps moving averages of what on_update and on_draw cost per frame
+    # and picks a quality level that fits them into the frame budget.
+    def __init__(self, budget_ms=TARGET_FRAME_MS, level=len(QUALITY_LEVELS) - 1):
+        self.budget_ms = budget_ms
+        self.level = level
+        self.update_ms = None
+        self.draw_ms = None
+        self.over = 0.0
+        self.under = 0.0
+        self.upgrade_delay = UPGRADE_DELAY
+        self.since_upgrade = None
+
+    @property
+    def settings(self):
+        return QUALITY_LEVELS[self.level]
+
+    def average(self, current, milliseconds):
+        milliseconds = min(milliseconds, self.budget_ms * SPIKE_LIMIT)
+        if current is None:
+            return milliseconds
+        return current + (milliseconds - current) * SMOOTHING
+
+    def add_update(self, milliseconds):
+        self.update_ms = self.average(self.update_ms, milliseconds)
+
+    def add_draw(self, milliseconds):
+        self.draw_ms = self.average(self.draw_ms, milliseconds)
+
+    def cost(self):
+        return (self.update_ms or 0.0) + (self.draw_ms or 0.0)
+
+    def adjust(self, delta_time):
+        # Called once per frame; returns the new level when it changed,
+        # otherwise None.
+        cost = self.cost()
+        if self.since_upgrade is not None:
+            self.since_upgrade += delta_time
+        self.over = self.over + delta_time if cost > self.budget_ms * DOWNGRADE_AT else 0.0
+        self.under = self.under + delta_time if cost < self.budget_ms * UPGRADE_AT else 0.0
+
+        if self.over >= DOWNGRADE_DELAY and self.level > 0:
+            if self.since_upgrade is not None and self.since_upgrade < PROBATION:
+                self.upgrade_delay = min(self.upgrade_delay * 2, MAX_UPGRADE_DELAY)
+            self.since_upgrade = None
+            return self.change(self.level - 1)
+        if self.under >= self.upgrade_delay and self.level < len(QUALITY_LEVELS) - 1:
+            self.since_upgrade = 0.0
+            return self.change(self.level + 1)
+        return None
+
+    def change(self, level):
+        # The averages were taken at the old level, so they start over.
+        self.level = level
+        self.update_ms = None
+        self.draw_ms = None
+        self.over = 0.0
+        self.under = 0.0
+        return level
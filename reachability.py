@@ -0,0 +1,208 @@
+import argparse
+import glob
+import math
+import os
+import sys
+import time
+from collections import deque
+
+from simulation import GRAVITY, PLAYER_JUMP_SPEED, PLAYER_MOVE_SPEED
+from sprites import Player, Rubles, Flag
+
+BUCKET_SIZE = 512
+# How many unreachable objects an error message lists by name.
+REPORT_LIMIT = 10
+
+
+def sprite_box(sprite):
+    # Hit box edges (left, bottom, right, top) relative to the sprite's center.
+    x, y = sprite.position
+    return sprite.left - x, sprite.bottom - y, sprite.right - x, sprite.top - y
+
+
+def jump_peak(speed):
+    # Highest the feet get above takeoff when leaving at vertical speed `speed`.
+    b = speed - GRAVITY / 2
+    return b * b / (2 * GRAVITY) if b > 0 else 0
+
+
+def jump_reach(rise, speed):
+    # How far the player's center can move sideways while leaving at
+    # vertical speed `speed` and keeping the feet at least `rise` above
+    # takeoff, or None when they never get that high. Same tick order as
+    # PhysicsEnginePlatformer (gravity, then the move): after k ticks the feet
+    # are speed * k - GRAVITY * k * (k + 1) / 2 above takeoff.
+    b = speed - GRAVITY / 2
+    d = b * b - 2 * GRAVITY * rise
+    if d < 0:
+        return None
+    ticks = math.floor((b + math.sqrt(d)) / GRAVITY + 1e-9)
+    if ticks < 0:
+        return None
+    return ticks * PLAYER_MOVE_SPEED
+
+
+class LevelGraph:
+    # Jump reachability for one level. The nodes are the player start and
+    # the platforms, and A -> B means a jump (or a fall) from somewhere on A
+    # lands on B. Platforms are bucketed on a grid by their top edge, so each
+    # node only tests the platforms inside its jump envelope rather than all
+    # of them. The model is optimistic: it ignores platforms in the way of a
+    # jump and enemies, so "unreachable" is certain and "reachable" is not.
+    def __init__(self, level, bucket_size=BUCKET_SIZE):
+        self.bucket_size = bucket_size
+        self.player_box = sprite_box(Player())
+        self.peak = jump_peak(PLAYER_JUMP_SPEED)
+
+        # (left, right, top) of every platform
+        self.platforms = [(x, x + width, y + height) for x, y, width, height in level['platforms']]
+        self.grid = {}
+        for index, (left, right, top) in enumerate(self.platforms):
+            row = int(top // bucket_size)
+            for column in range(int(left // bucket_size), int(right // bucket_size) + 1):
+                self.grid.setdefault((column, row), []).append(index)
+        # (center left, center right, top): where the player can stand on each
+        self.nodes = [self.centers(left, right) + (top,) for left, right, top in self.platforms]
+        tops = [top for _, _, top in self.platforms]
+        self.lowest = min(tops, default=0)
+        self.highest = max(tops, default=0)
+
+        x, y = level['player_start']
+        self.start = (x, x, y + self.player_box[1])
+        self.spawn = self.overlapping(x, y)
+        self.level = level
+        self.missing = None
+        self.reachable = self.search()
+
+    def centers(self, left, right):
+        # Player center positions at which its hit box overlaps [left, right].
+        box_left, _, box_right, _ = self.player_box
+        return left - box_right, right - box_left
+
+    def lands(self, source, speed, target, reach=None):
+        # Can a jump from source leave the player's feet at target's height
+        # or higher while over it? Both are (center left, center right,
+        # feet). reach, when given, is an upper bound on the jump's reach
+        # that rules out distant targets without the exact arc.
+        source_left, source_right, source_feet = source
+        target_left, target_right, feet = target
+        gap = max(target_left - source_right, source_left - target_right, 0)
+        if reach is not None and gap > reach:
+            return False
+        reach = jump_reach(feet - source_feet, speed)
+        return reach is not None and gap <= reach
+
+    def rows(self, bottom, top):
+        size = self.bucket_size
+        for row in range(int(bottom // size), int(top // size) + 1):
+            yield row, row * size, (row + 1) * size
+
+    def cells(self, row, left, right):
+        size = self.bucket_size
+        for column in range(int(left // size), int(right // size) + 1):
+            yield from self.grid.get((column, row), ())
+
+    def overlapping(self, x, y):
+        # Platforms the player's hit box overlaps at (x, y): the physics
+        # engine pushes a player spawned there up onto them.
+        box_left, box_bottom, box_right, box_top = self.player_box
+        found = []
+        for row, _, _ in self.rows(y + box_bottom, y + box_top):
+            for index in self.cells(row, x + box_left, x + box_right):
+                left, right, top = self.platforms[index]
+                if (index not in found and left <= x + box_right and right >= x + box_left
+                        and y + box_bottom <= top <= y + box_top):
+                    found.append(index)
+        return found
+
+    def targets(self, source, speed, skip=()):
+        # Platforms a jump from source can land on, leaving out those in
+        # skip. The lower a row, the longer the fall and the wider the
+        # reach, so each row of buckets is searched as wide as a fall to its
+        # bottom edge allows.
+        source_left, source_right, feet = source
+        box_left, _, box_right, _ = self.player_box
+        for row, row_bottom, _ in self.rows(self.lowest, feet + self.peak):
+            reach = jump_reach(max(row_bottom, self.lowest) - feet, speed)
+            if reach is None:
+                continue
+            for index in self.cells(row, source_left - reach + box_left, source_right + reach + box_right):
+                if index not in skip and self.lands(source, speed, self.nodes[index], reach):
+                    yield index
+
+    def search(self):
+        reached = set()
+        queue = deque()
+        # The player starts in the air and can only fall, unless the start
+        # is inside a platform.
+        for index in self.spawn + list(self.targets(self.start, 0)):
+            if index not in reached:
+                reached.add(index)
+                queue.append(index)
+        while queue:
+            for index in self.targets(self.nodes[queue.popleft()], PLAYER_JUMP_SPEED, reached):
+                if index not in reached:
+                    reached.add(index)
+                    queue.append(index)
+        return reached
+
+    def can_reach(self, left, bottom, right):
+        # Can the player's hit box touch a box with this left, bottom and
+        # right edge? Only sources up to a jump below it or anywhere above
+        # it count, again with the reach of each row bounded by its top.
+        box_left, box_bottom, box_right, box_top = self.player_box
+        target = self.centers(left, right) + (bottom - (box_top - box_bottom),)
+        feet = target[2]
+        if self.lands(self.start, 0, target):
+            return True
+        for row, _, row_top in self.rows(feet - self.peak, self.highest):
+            reach = jump_reach(feet - min(row_top, self.highest), PLAYER_JUMP_SPEED)
+            if reach is None:
+                continue
+            for index in self.cells(row, left - reach + box_left, right + reach + box_right):
+                if index in self.reachable and self.lands(self.nodes[index], PLAYER_JUMP_SPEED,
+                                                          target, reach):
+                    return True
+        return False
+
+    def unreachable(self):
+        # Names of the rubles and the flag no jump can get to, as
+        # "rubless[i]" and "flag". Worked out once per graph.
+        if self.missing is not None:
+            return self.missing
+        level = self.level
+        missing = []
+        for kind, entries, sprite in (('rubless', level['rubless'], Rubles(0, 0)),
+                                      ('flag', [level['flag']], Flag(0, 0))):
+            left, bottom, right, _ = sprite_box(sprite)
+            for i, (x, y) in enumerate(entries):
+                if not self.can_reach(x + left, y + bottom, x + right):
+                    missing.append(f"{kind}[{i}]" if kind == 'rubless' else kind)
+        self.missing = missing
+        return missing
+
+
+def main():
+    from levels import LEVELS, LEVEL_DIR, LevelError
+
+    parser = argparse.ArgumentParser(description="Check that every level can be completed")
+    parser.add_argument("files", nargs="*")
+    args = parser.parse_args()
+
+    failed = False
+    for path in args.files or sorted(glob.glob(os.path.join(LEVEL_DIR, "*.json"))):
+        start = time.perf_counter()
+        try:
+            graph = LEVELS.check(path)
+        except LevelError as e:
+            print(e)
+            failed = True
+            continue
+        elapsed = time.perf_counter() - start
+        print(f"{path}: {len(graph.reachable)}/{len(graph.platforms)} platforms reachable, "
+              f"ok in {elapsed:.2f} s")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import argparse
+import hashlib
+import struct
+import sys
+import time
+
+from levels import level_digest
+from simulation import Simulation, COMMANDS
+from timestep import lerp_xy
+
+PRESS = 0
+RELEASE = 1
+
+# File layout: header, then one entry per input event: the number of ticks
+# since the previous event as a varint, then a byte holding
+# action << 4 | command index.
+REPLAY_MAGIC = b"BGRP"
+REPLAY_VERSION = 1
+REPLAY_HEADER = struct.Struct('<4sHQH8s2d2ddII32s')
+
+
+class ReplayError(ValueError):
+    pass
+
+
+def world_digest(world):
+    # Everything a run can change, packed as exact float bits.
+    player = world.player
+    enemies = world.enemies
+    n = enemies.count
+    h = hashlib.sha256()
+    h.update(struct.pack('<I16s4d6i', world.ticks, world.state.encode('utf-8'),
+                         player.center_x, player.center_y, player.change_x, player.change_y,
+                         player.score, player.rubless,
+                         player.lives, world.pmcs_defeated, len(world.rubless), n))
+    for array in (enemies.x, enemies.y, enemies.vx, enemies.alive):
+        h.update(array[:n].tobytes())
+    for rubles in world.rubless:
+        h.update(struct.pack('<2d', rubles.center_x, rubles.center_y))
+    return h.digest()
+
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise ReplayError("обрезанный файл повтора")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class Recording:
+    # One level run: what is needed to rebuild the world (level, particle
+    # seed, camera settings), the inputs as (tick, action, command), and
+    # the digest of the world when the run ended.
+    def __init__(self, level_num, level, seed, camera_start, view, camera_speed):
+        self.level_num = level_num
+        self.level_digest = level_digest(level)
+        self.seed = seed
+        self.camera_start = tuple(camera_start)
+        self.view = tuple(view)
+        self.camera_speed = camera_speed
+        self.events = []
+        self.ticks = 0
+        self.digest = bytes(32)
+
+    def record(self, tick, action, command):
+        self.events.append((tick, action, command))
+
+    def finish(self, world):
+        self.ticks = world.ticks
+        self.digest = world_digest(world)
+
+    def to_bytes(self):
+        out = bytearray(REPLAY_HEADER.pack(
+            REPLAY_MAGIC, REPLAY_VERSION, self.seed, self.level_num, self.level_digest,
+            *self.camera_start, *self.view, self.camera_speed,
+            len(self.events), self.ticks, self.digest))
+        last_tick = 0
+        for tick, action, command in self.events:
+            write_varint(out, tick - last_tick)
+            out.append(action << 4 | COMMANDS.index(command))
+            last_tick = tick
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) < REPLAY_HEADER.size:
+            raise ReplayError("файл повтора слишком короткий")
+        (magic, version, seed, level_num, digest, camera_x, camera_y, view_width, view_height,
+         camera_speed, count, ticks, result) = REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ReplayError("неизвестный формат файла повтора")
+
+        recording = cls.__new__(cls)
+        recording.level_num = level_num
+        recording.level_digest = digest
+        recording.seed = seed
+        recording.camera_start = (camera_x, camera_y)
+        recording.view = (view_width, view_height)
+        recording.camera_speed = camera_speed
+        recording.ticks = ticks
+        recording.digest = result
+        recording.events = []
+
+        offset = REPLAY_HEADER.size
+        tick = 0
+        for _ in range(count):
+            delta, offset = read_varint(data, offset)
+            if offset >= len(data):
+                raise ReplayError("обрезанный файл повтора")
+            code = data[offset]
+            offset += 1
+            tick += delta
+            recording.events.append((tick, code >> 4, COMMANDS[code & 0x0f]))
+        return recording
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+class ReplayInput:
+    # Feeds a recording's inputs into a world, tick by tick.
+    def __init__(self, recording):
+        self.recording = recording
+        self.next_event = 0
+
+    def apply(self, world):
+        events = self.recording.events
+        while self.next_event < len(events) and events[self.next_event][0] <= world.ticks:
+            _, action, command = events[self.next_event]
+            if action == PRESS:
+                world.press(command)
+            else:
+                world.release(command)
+            self.next_event += 1
+
+    def finished(self, world):
+        return world.ticks >= self.recording.ticks or world.state != "playing"
+
+
+def create_world(recording):
+    world = Simulation(recording.level_num, streaming=True, view=recording.view)
+    if level_digest(world.level) != recording.level_digest:
+        world.close()
+        raise ReplayError(f"уровень {recording.level_num} изменился после записи")
+    return world
+
+
+def replay_headless(recording):
+    # Runs the recording as fast as possible with the same per-tick order as
+    # GameWindow.on_update (inputs, step, camera) and returns the final world.
+    world = create_world(recording)
+    replay = ReplayInput(recording)
+    camera = recording.camera_start
+    try:
+        while not replay.finished(world):
+            replay.apply(world)
+            world.step()
+            camera = lerp_xy(camera, world.player.position, recording.camera_speed)
+            world.view_center = camera
+    finally:
+        world.close()
+    return world
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded run without a window")
+    parser.add_argument("files", nargs="+")
+    args = parser.parse_args()
+
+    failed = False
+    for path in args.files:
+        recording = Recording.load(path)
+        start = time.perf_counter()
+        world = replay_headless(recording)
+        elapsed = time.perf_counter() - start
+        match = world_digest(world) == recording.digest
+        failed = failed or not match
+        print(f"{path}: level {recording.level_num}, {world.ticks} ticks, "
+              f"{len(recording.events)} inputs, {world.ticks / max(elapsed, 1e-9):.0f} ticks/sec, "
+              f"{'match' if match else 'MISMATCH'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import argparse
+import random
+import time
+
+import arcade
+from levels import Level
+from sprites import Player, Rubles, PMC, Platform, Flag
+from enemies import EnemyEngine, BEHAVIORS
+from collisions import CollisionWorld
+from timestep import SIMULATION_STEP
+from profiler import PROFILER
+from streaming import ChunkStreamer, VIEW_SIZE
+
+GRAVITY = 1
+PLAYER_JUMP_SPEED = 20
+PLAYER_MOVE_SPEED = 5
+
+# Input commands, fed in through press() / release().
+MOVE_LEFT = "left"
+MOVE_RIGHT = "right"
+JUMP = "jump"
+COMMANDS = (MOVE_LEFT, MOVE_RIGHT, JUMP)
+
+# Events returned by step(), as (event, x, y) tuples.
+PMC_DEFEATED = "pmc_defeated"
+RUBLES_COLLECTED = "rubles_collected"
+DEATH = "death"
+RESPAWN = "respawn"
+LEVEL_COMPLETE = "level_complete"
+
+
+class Simulation:
+    # All game rules for one level, with no window or GL context involved:
+    # sprites are only used for their geometry and the physics engine. A
+    # renderer feeds commands in, calls step() once per fixed tick and reacts
+    # to the returned events.
+    def __init__(self, level_num, level=None, streaming=False, view=VIEW_SIZE):
+        # level: a dict in the Level.get_level schema, for levels that do not
+        # come from levels.py (benchmarks, generated stress levels).
+        # streaming: only keep the chunks around the player and view_center
+        # (the camera, set by the renderer) in the world, see
+        # streaming.ChunkStreamer.
+        self.level_num = level_num
+        self.level = level if level is not None else Level.get_level(level_num)
+        self.state = "playing"
+        self.ticks = 0
+        self.pmcs_defeated = 0
+        self.events = []
+
+        self.player = Player()
+        self.player.level = level_num
+        self.player.center_x, self.player.center_y = self.level['player_start']
+        # Lazy lists never touch the GL context until they are first drawn,
+        # so a Simulation can be built on any thread (see preload.py).
+        self.players = arcade.SpriteList(lazy=True)
+        self.players.append(self.player)
+
+        self.platforms = arcade.SpriteList(use_spatial_hash=True, lazy=True)
+        self.rubless = arcade.SpriteList(use_spatial_hash=True, lazy=True)
+        self.pmcs = arcade.SpriteList(lazy=True)
+
+        # (kind, index) in the level data of every rubles item collected and
+        # PMC defeated; each rubles and PMC sprite carries its own as
+        # level_item.
+        self.removed = set()
+        self.view_center = None
+        self.streamer = None
+        if streaming:
+            self.enemies = EnemyEngine()
+            self.streamer = ChunkStreamer(self, self.player.position, view=view)
+        else:
+            for plat in self.level['platforms']:
+                platform = Platform(*plat)
+                self.platforms.append(platform)
+
+            for index, rubles_pos in enumerate(self.level['rubless']):
+                rubles = Rubles(*rubles_pos)
+                rubles.level_item = ('rubless', index)
+                self.rubless.append(rubles)
+
+            self.enemies = EnemyEngine(len(self.level['pmcs']))
+            for index, pmc_data in enumerate(self.level['pmcs']):
+                pmc = PMC(*pmc_data)
+                pmc.level_item = ('pmcs', index)
+                self.pmcs.append(pmc)
+                self.enemies.add(pmc, pmc.left_bound, pmc.right_bound,
+                                 pmc.change_x, BEHAVIORS[pmc.behavior])
+
+        self.flags = arcade.SpriteList(use_spatial_hash=True, lazy=True)
+        self.flag = Flag(*self.level['flag'])
+        self.flags.append(self.flag)
+
+        self.collisions = CollisionWorld(self.rubless, self.flags, self.enemies)
+
+        # Platforms never move, so they are walls: the engine's "platforms"
+        # argument is for moving platforms and gets iterated every update.
+        self.physics_engine = arcade.PhysicsEnginePlatformer(
+            self.player,
+            walls=self.platforms,
+            gravity_constant=GRAVITY
+        )
+
+    @property
+    def elapsed_time(self):
+        return self.ticks * SIMULATION_STEP
+
+    def press(self, command):
+        if command == MOVE_LEFT:
+            self.player.change_x = -PLAYER_MOVE_SPEED
+        elif command == MOVE_RIGHT:
+            self.player.change_x = PLAYER_MOVE_SPEED
+        elif command == JUMP:
+            if self.physics_engine.can_jump():
+                self.player.change_y = PLAYER_JUMP_SPEED
+
+    def release(self, command):
+        if command in (MOVE_LEFT, MOVE_RIGHT):
+            self.player.change_x = 0
+
+    def step(self):
+        events = self.events = []
+        if self.state != "playing":
+            return events
+        self.ticks += 1
+
+        if self.streamer is not None:
+            with PROFILER.scope("streaming"):
+                if self.view_center is None:
+                    self.streamer.focus(self.player.position)
+                else:
+                    self.streamer.focus(self.view_center, self.player.position)
+
+        with PROFILER.scope("physics"):
+            self.physics_engine.update()
+
+        with PROFILER.scope("enemies"):
+            self.enemies.step(self.player.center_x)
+
+        with PROFILER.scope("collisions"):
+            self.collisions.update()
+            pmc_hit_list = self.collisions.pmc_hits(self.player)
+
+        for pmc in pmc_hit_list:
+            if self.player.change_y < 0 and self.player.bottom > pmc.top - 30:
+                events.append((PMC_DEFEATED, pmc.center_x, pmc.center_y))
+
+                pmc.remove_from_sprite_lists()
+                self.enemies.remove(pmc)
+                self.forget(pmc)
+                self.pmcs_defeated += 1
+                self.player.score += 100
+                self.player.change_y = PLAYER_JUMP_SPEED / 2
+            else:
+                self.lose_life()
+
+        if self.player.top < 0:
+            self.lose_life()
+
+        with PROFILER.scope("collisions"):
+            rubles_hit_list = self.collisions.rubles_hits(self.player)
+            flag_hit = self.collisions.flag_hit(self.player)
+        for rubles in rubles_hit_list:
+            events.append((RUBLES_COLLECTED, rubles.center_x, rubles.center_y))
+            rubles.remove_from_sprite_lists()
+            self.forget(rubles)
+            self.player.rubless += 1
+            self.player.score += 10
+
+        if flag_hit:
+            events.append((LEVEL_COMPLETE, self.player.center_x, self.player.center_y))
+            self.state = "level_complete"
+
+        return events
+
+    def forget(self, sprite):
+        # The sprite was collected or defeated: it never comes back.
+        self.removed.add(sprite.level_item)
+        if self.streamer is not None:
+            self.streamer.forget(sprite)
+
+    def close(self):
+        if self.streamer is not None:
+            self.streamer.close()
+
+    def lose_life(self):
+        self.events.append((DEATH, self.player.center_x, self.player.center_y))
+        self.player.lives -= 1
+        if self.player.lives <= 0:
+            self.state = "game_over"
+        else:
+            self.player.center_x, self.player.center_y = self.level['player_start']
+            self.events.append((RESPAWN, self.player.center_x, self.player.center_y))
+
+
+class RandomBot:
+    # Presses random commands now and then and lets go of movement.
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+
+    def act(self, world):
+        roll = self.rng.random()
+        if roll < 0.05:
+            world.press(self.rng.choice(COMMANDS))
+        elif roll < 0.08:
+            world.release(MOVE_LEFT)
+
+
+class RunnerBot:
+    # Runs right and jumps at gaps, at PMCs ahead and when stuck, with a
+    # little randomness so runs with different seeds differ.
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.last_x = None
+
+    def act(self, world):
+        player = world.player
+        world.press(MOVE_RIGHT)
+        stuck = self.last_x is not None and player.center_x - self.last_x < 1
+        self.last_x = player.center_x
+
+        ahead = player.center_x + player.width / 2 + 10
+        gap = not arcade.get_sprites_at_point((ahead, player.bottom - 5), world.platforms)
+        pmc = world.collisions.enemy_grid.near(player.right, player.bottom, player.right + 120, player.top)
+        if gap or pmc or stuck or self.rng.random() < 0.02:
+            world.press(JUMP)
+
+
+BOTS = {
+    'random': RandomBot,
+    'runner': RunnerBot,
+}
+
+
+def run_random_bot(level_num, ticks, seed=0):
+    # Plays random inputs for a number of ticks, restarting the level when
+    # it ends. Returns the number of levels played.
+    bot = RandomBot(seed)
+    sim = Simulation(level_num)
+    levels_played = 1
+    for _ in range(ticks):
+        bot.act(sim)
+        sim.step()
+        if sim.state != "playing":
+            sim = Simulation(level_num)
+            levels_played += 1
+    return levels_played
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the game simulation without a window")
+    parser.add_argument("--level", type=int, default=1)
+    parser.add_argument("--ticks", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    levels_played = run_random_bot(args.level, args.ticks, args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"{args.ticks} ticks, {levels_played} levels played, "
+          f"{args.ticks / elapsed:.0f} ticks/sec")
+
+
+if __name__ == "__main__":
+    main()
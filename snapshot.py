@@ -0,0 +1,144 @@
+import struct
+
+import numpy as np
+
+from enemies import BOB, BOB_AMPLITUDE
+from levels import level_digest
+
+# Layout: header (level, ticks, player, flag animation, table sizes), a
+# bitset of collected rubles and one of defeated PMCs (bit i = level entry
+# i, little-endian bit order), then one PMC_RECORD per PMC that has moved.
+SNAPSHOT_MAGIC = b"BGSS"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('<4sHH8sI4d4iBd3I')
+PMC_RECORD = np.dtype([
+    ('index', '<u4'),
+    ('x', '<f8'),
+    ('base_y', '<f8'),
+    ('vx', '<f8'),
+    ('phase', '<f8'),
+    ('left', '<f8'),
+    ('right', '<f8'),
+])
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def removed_bits(world, kind):
+    flags = np.zeros(len(world.level[kind]), dtype=bool)
+    indices = [index for item_kind, index in world.removed if item_kind == kind]
+    flags[indices] = True
+    return np.packbits(flags, bitorder='little').tobytes()
+
+
+def removed_indices(data, offset, count):
+    size = (count + 7) // 8
+    bits = np.frombuffer(data, dtype=np.uint8, count=size, offset=offset)
+    return np.flatnonzero(np.unpackbits(bits, count=count, bitorder='little')).tolist(), offset + size
+
+
+def pmc_records(world):
+    # PMCs in the world come from the engine arrays; with streaming, PMCs
+    # unloaded since are in the streamer (without a bob phase). PMCs never
+    # loaded are still where the level puts them and are left out.
+    enemies = world.enemies
+    alive = np.flatnonzero(enemies.alive[:enemies.count])
+    saved = world.streamer.saved_pmcs if world.streamer is not None else {}
+    records = np.empty(len(alive) + len(saved), dtype=PMC_RECORD)
+    records['index'][:len(alive)] = [enemies.sprites[i].level_item[1] for i in alive.tolist()]
+    for name in ('x', 'base_y', 'vx', 'phase', 'left', 'right'):
+        records[name][:len(alive)] = getattr(enemies, name)[alive]
+    pmcs = world.level['pmcs']
+    for row, (index, (x, base_y, vx)) in enumerate(saved.items(), len(alive)):
+        records[row] = (index, x, base_y, vx, 0.0, pmcs[index][2], pmcs[index][3])
+    return records
+
+
+def capture(world):
+    # The full state of a running Simulation as bytes; see restore().
+    player = world.player
+    flag = world.flag
+    records = pmc_records(world)
+    header = SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_VERSION, world.level_num, level_digest(world.level), world.ticks,
+        player.center_x, player.center_y, player.change_x, player.change_y,
+        player.score, player.rubless, player.lives, world.pmcs_defeated,
+        flag.current_frame, flag.animation_timer,
+        len(world.level['rubless']), len(world.level['pmcs']), len(records))
+    return b"".join([header, removed_bits(world, 'rubless'), removed_bits(world, 'pmcs'), records.tobytes()])
+
+
+def restore(world, data):
+    # Puts a snapshot taken by capture() into a freshly built Simulation of
+    # the same level. Raises SnapshotError when the data is damaged or was
+    # taken on another level (or another version of it).
+    if len(data) < SNAPSHOT_HEADER.size:
+        raise SnapshotError("снимок слишком короткий")
+    (magic, version, level_num, digest, ticks, x, y, change_x, change_y,
+     score, rubless, lives, pmcs_defeated, flag_frame, flag_timer,
+     n_rubless, n_pmcs, n_records) = SNAPSHOT_HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise SnapshotError("неизвестный формат снимка")
+    if (level_num != world.level_num or digest != level_digest(world.level)
+            or n_rubless != len(world.level['rubless']) or n_pmcs != len(world.level['pmcs'])):
+        raise SnapshotError(f"снимок сделан на другом уровне ({level_num})")
+    size = SNAPSHOT_HEADER.size + (n_rubless + 7) // 8 + (n_pmcs + 7) // 8 + n_records * PMC_RECORD.itemsize
+    if len(data) != size:
+        raise SnapshotError("снимок поврежден")
+
+    offset = SNAPSHOT_HEADER.size
+    collected, offset = removed_indices(data, offset, n_rubless)
+    defeated, offset = removed_indices(data, offset, n_pmcs)
+    records = np.frombuffer(data, dtype=PMC_RECORD, count=n_records, offset=offset)
+
+    world.ticks = ticks
+    world.pmcs_defeated = pmcs_defeated
+    player = world.player
+    player.center_x, player.center_y = x, y
+    player.change_x, player.change_y = change_x, change_y
+    player.score, player.rubless, player.lives = score, rubless, lives
+
+    flag = world.flag
+    if flag.flag_textures:
+        flag.current_frame = flag_frame % len(flag.flag_textures)
+        flag.texture = flag.flag_textures[flag.current_frame]
+    flag.animation_timer = flag_timer
+
+    world.removed.update(('rubless', index) for index in collected)
+    world.removed.update(('pmcs', index) for index in defeated)
+    for rubles in list(world.rubless):
+        if rubles.level_item in world.removed:
+            rubles.remove_from_sprite_lists()
+            world.forget(rubles)
+    loaded = {}
+    for pmc in list(world.pmcs):
+        if pmc.level_item in world.removed:
+            world.enemies.remove(pmc)
+            pmc.remove_from_sprite_lists()
+            world.forget(pmc)
+        else:
+            loaded[pmc.level_item[1]] = pmc
+
+    enemies = world.enemies
+    for index, x, base_y, vx, phase, left, right in records.tolist():
+        pmc = loaded.get(index)
+        if pmc is None:
+            # Not in the world yet: the streamer applies it on load.
+            if world.streamer is not None:
+                world.streamer.saved_pmcs[index] = (x, base_y, vx)
+            continue
+        i = pmc.engine_index
+        pmc_y = base_y + BOB_AMPLITUDE * np.sin(phase) if enemies.behavior[i] == BOB else base_y
+        enemies.x[i] = enemies.prev_x[i] = x
+        enemies.y[i] = enemies.prev_y[i] = pmc_y
+        enemies.base_y[i] = base_y
+        enemies.vx[i] = vx
+        enemies.phase[i] = phase
+        enemies.left[i] = pmc.left_bound = left
+        enemies.right[i] = pmc.right_bound = right
+        pmc.position = (x, float(pmc_y))
+
+    if world.streamer is not None:
+        world.streamer.focus(player.position)
@@ -0,0 +1,79 @@
+import arcade
+from textures import TEXTURES, PLAYER_TEXTURE, RUBLES_TEXTURE, PMC_TEXTURE, PLATFORM_TEXTURE, FLAG_TEXTURES
+
+
+class Player(arcade.Sprite):
+    def __init__(self):
+        super().__init__(TEXTURES.get(PLAYER_TEXTURE))
+        self.scale = 0.15
+        self.center_x = 50
+        self.center_y = 150
+        self.change_x = 0
+        self.change_y = 0
+        self.jumping = False
+        self.rubless = 0
+        self.score = 0
+        self.lives = 3
+        self.level = 1
+
+class Rubles(arcade.Sprite):
+    def __init__(self, x, y):
+        super().__init__(TEXTURES.get(RUBLES_TEXTURE), 0.1)
+        self.center_x = x
+        self.center_y = y
+
+class PMC(arcade.Sprite):
+    def __init__(self, x, y, left_bound, right_bound, behavior='patrol'):
+        super().__init__(TEXTURES.get(PMC_TEXTURE), 0.1)
+        self.center_x = x
+        self.center_y = y
+        self.change_x = 2
+        self.left_bound = left_bound
+        self.right_bound = right_bound
+        self.behavior = behavior
+        self.engine_index = None
+
+class Platform(arcade.Sprite):
+    def __init__(self, x, y, width, height):
+        super().__init__(TEXTURES.get(PLATFORM_TEXTURE))
+        self.center_x = x + width / 2
+        self.center_y = y + height / 2
+        self.width = width
+        self.height = height
+
+class Flag(arcade.Sprite):
+    def __init__(self, x, y):
+        super().__init__()
+        self.flag_textures = TEXTURES.frames(FLAG_TEXTURES)
+        
+        self.scale = 3.0
+        self.texture = self.flag_textures[0]
+        self.center_x = x
+        self.center_y = y
+
+        self.current_frame = 0
+        self.animation_speed = 0.15
+        self.animation_timer = 0.0
+        self.animation_active = True
+    
+    def update_animation(self, delta_time):
+        if not self.animation_active or len(self.flag_textures) == 0:
+            return
+        
+        self.animation_timer += delta_time
+
+        if self.animation_timer >= self.animation_speed:
+            self.animation_timer = 0.0
+
+            self.current_frame += 1
+
+            if self.current_frame >= len(self.flag_textures):
+                self.current_frame = 0
+
+            self.texture = self.flag_textures[self.current_frame]
+    
+    def start_animation(self):
+        self.animation_active = True
+    
+    def stop_animation(self):
+        self.animation_active = False
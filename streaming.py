@@ -0,0 +1,219 @@
+import queue
+import threading
+
+from sprites import Platform, Rubles, PMC
+from enemies import BEHAVIORS
+
+CHUNK_SIZE = 1024
+# Visible world area around the focus point (the window passes its real one).
+VIEW_SIZE = (1000, 750)
+# Extra world units around the view: chunks inside LOAD_MARGIN are in the
+# world, chunks outside UNLOAD_MARGIN are dropped, and chunks in between
+# stay as they are. The background thread builds sprites out to
+# PREFETCH_MARGIN so chunks are usually ready by the time they load.
+LOAD_MARGIN = 256
+UNLOAD_MARGIN = 768
+PREFETCH_MARGIN = 1536
+
+SPRITE_TYPES = {
+    'platforms': Platform,
+    'rubless': Rubles,
+    'pmcs': PMC,
+}
+
+
+def object_box(kind, entry):
+    if kind == 'platforms':
+        x, y, width, height = entry
+        return x, y, x + width, y + height
+    if kind == 'rubless':
+        x, y = entry
+        return x, y, x, y
+    # A PMC can be anywhere along its patrol.
+    x, y, left, right = entry[:4]
+    return min(x, left), y, max(x, right), y
+
+
+def build_chunks(level, chunk_size=CHUNK_SIZE):
+    # Chunk key -> (kind, index) of every object overlapping that chunk.
+    # Objects spanning several chunks are listed in each of them.
+    chunks = {}
+    for kind in SPRITE_TYPES:
+        for index, entry in enumerate(level[kind]):
+            left, bottom, right, top = object_box(kind, entry)
+            for cx in range(int(left // chunk_size), int(right // chunk_size) + 1):
+                for cy in range(int(bottom // chunk_size), int(top // chunk_size) + 1):
+                    chunks.setdefault((cx, cy), []).append((kind, index))
+    return chunks
+
+
+class ChunkStreamer:
+    # Keeps only the chunks around the focus points instantiated in a
+    # Simulation's sprite lists. Objects are reference-counted by the loaded
+    # chunks that list them, collected rubles and defeated PMCs are
+    # remembered so they stay gone, and unloaded PMCs keep their position
+    # and direction for when they come back.
+    #
+    # Which chunks are loaded depends only on the focus points passed to
+    # focus(), never on thread timing: the background thread merely builds
+    # sprites ahead of time, and a chunk that is needed before its sprites
+    # are ready is built inline (counted in stalls).
+    def __init__(self, world, start, chunk_size=CHUNK_SIZE, view=VIEW_SIZE, background=True):
+        self.world = world
+        self.level = world.level
+        self.chunk_size = chunk_size
+        self.view = view
+        self.chunks = build_chunks(self.level, chunk_size)
+
+        self.loaded = set()
+        self.refs = {}
+        self.sprites = {}
+        # Shared with the world, which adds what is collected or defeated.
+        self.removed = world.removed
+        self.saved_pmcs = {}
+
+        self.prefetched = {}
+        self.requested = set()
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.worker = None
+        self.loads = 0
+        self.unloads = 0
+        self.stalls = 0
+
+        # The starting area is loaded up front, before there is anything to
+        # prefetch.
+        self.focus(start)
+        if background:
+            self.worker = threading.Thread(target=self._run, name="chunk-streamer", daemon=True)
+            self.worker.start()
+
+    def chunks_around(self, points, margin):
+        size = self.chunk_size
+        half_width = self.view[0] / 2 + margin
+        half_height = self.view[1] / 2 + margin
+        keys = set()
+        for x, y in points:
+            for cx in range(int((x - half_width) // size), int((x + half_width) // size) + 1):
+                for cy in range(int((y - half_height) // size), int((y + half_height) // size) + 1):
+                    if (cx, cy) in self.chunks:
+                        keys.add((cx, cy))
+        return keys
+
+    def focus(self, *points):
+        # points: (x, y) world positions to keep loaded, usually the camera
+        # center and the player (who can respawn far from the camera).
+        self.collect_prefetched()
+
+        keep = self.chunks_around(points, UNLOAD_MARGIN)
+        for key in sorted(self.loaded - keep):
+            self.unload(key)
+        for key in sorted(self.chunks_around(points, LOAD_MARGIN) - self.loaded):
+            self.load(key)
+
+        if self.worker is not None:
+            ahead = self.chunks_around(points, PREFETCH_MARGIN)
+            for key in list(self.prefetched):
+                if key not in ahead:
+                    del self.prefetched[key]
+            for key in sorted(ahead - self.loaded - self.requested - self.prefetched.keys()):
+                self.requested.add(key)
+                self.requests.put(key)
+
+    def build(self, key):
+        built = {}
+        for item in self.chunks[key]:
+            if item not in self.removed and item not in self.sprites:
+                kind, index = item
+                built[item] = SPRITE_TYPES[kind](*self.level[kind][index])
+        return built
+
+    def collect_prefetched(self):
+        while True:
+            try:
+                key, built = self.results.get_nowait()
+            except queue.Empty:
+                return
+            self.requested.discard(key)
+            if key not in self.loaded:
+                self.prefetched[key] = built
+
+    def load(self, key):
+        built = self.prefetched.pop(key, None)
+        if built is None:
+            if self.worker is not None:
+                self.stalls += 1
+            built = self.build(key)
+
+        for item in self.chunks[key]:
+            self.refs[item] = self.refs.get(item, 0) + 1
+            if item in self.sprites or item in self.removed:
+                continue
+            sprite = built.get(item)
+            if sprite is None:
+                kind, index = item
+                sprite = SPRITE_TYPES[kind](*self.level[kind][index])
+            self.attach(item, sprite)
+        self.loaded.add(key)
+        self.loads += 1
+
+    def unload(self, key):
+        for item in self.chunks[key]:
+            refs = self.refs[item] - 1
+            if refs:
+                self.refs[item] = refs
+                continue
+            del self.refs[item]
+            sprite = self.sprites.pop(item, None)
+            if sprite is not None:
+                self.detach(item, sprite)
+        self.loaded.discard(key)
+        self.unloads += 1
+
+    def attach(self, item, sprite):
+        kind, index = item
+        sprite.level_item = item
+        self.sprites[item] = sprite
+        world = self.world
+        if kind == 'platforms':
+            world.platforms.append(sprite)
+        elif kind == 'rubless':
+            world.rubless.append(sprite)
+        else:
+            saved = self.saved_pmcs.pop(index, None)
+            if saved is not None:
+                sprite.center_x, sprite.center_y, sprite.change_x = saved
+            world.pmcs.append(sprite)
+            world.enemies.add(sprite, sprite.left_bound, sprite.right_bound,
+                              sprite.change_x, BEHAVIORS[sprite.behavior])
+
+    def detach(self, item, sprite):
+        kind, index = item
+        if kind == 'pmcs':
+            enemies = self.world.enemies
+            i = sprite.engine_index
+            if i is not None:
+                self.saved_pmcs[index] = (float(enemies.x[i]), float(enemies.base_y[i]), float(enemies.vx[i]))
+            enemies.remove(sprite)
+        sprite.remove_from_sprite_lists()
+
+    def forget(self, sprite):
+        # The sprite was collected or defeated (and is in self.removed now):
+        # it is no longer ours to unload.
+        self.sprites.pop(sprite.level_item, None)
+
+    def live_count(self):
+        return len(self.sprites)
+
+    def _run(self):
+        while True:
+            key = self.requests.get()
+            if key is None:
+                return
+            self.results.put((key, self.build(key)))
+
+    def close(self):
+        if self.worker is not None:
+            self.requests.put(None)
+            self.worker.join()
+            self.worker = None
@@ -0,0 +1,166 @@
+import argparse
+import struct
+import zlib
+from array import array
+
+import numpy as np
+
+from simulation import RUBLES_COLLECTED, PMC_DEFEATED, DEATH, RESPAWN, LEVEL_COMPLETE
+
+# Event kinds as stored; FRAME is a frame-time sample (value in ms),
+# QUALITY a change of graphics quality (value: the new level, see
+# quality.QUALITY_LEVELS), the rest are the Simulation events of the same
+# name. New kinds go at the end, so stored codes keep their meaning.
+FRAME = "frame"
+QUALITY = "quality"
+EVENT_KINDS = (RUBLES_COLLECTED, PMC_DEFEATED, DEATH, RESPAWN, LEVEL_COMPLETE, FRAME, QUALITY)
+EVENT_CODES = {kind: code for code, kind in enumerate(EVENT_KINDS)}
+
+# One frame in this many is sampled; at 60 fps that is 10 samples a second.
+FRAME_SAMPLE_INTERVAL = 6
+HEATMAP_CELL = 64
+
+# Blob layout: header, then the zlib-compressed columns one after another:
+# kind codes (uint8), tick deltas (uint32), x, y and value (float32).
+TELEMETRY_MAGIC = b"BGTE"
+TELEMETRY_VERSION = 1
+TELEMETRY_HEADER = struct.Struct('<4sHI')
+COLUMNS = (('kinds', 'B'), ('ticks', 'I'), ('x', 'f'), ('y', 'f'), ('values', 'f'))
+
+
+class TelemetryError(ValueError):
+    pass
+
+
+class RunTelemetry:
+    # Events of one level run, kept column by column in typed arrays so a
+    # record is a few appends, and packed into one blob when the run ends.
+    def __init__(self):
+        self.kinds = array('B')
+        self.ticks = array('I')
+        self.x = array('f')
+        self.y = array('f')
+        self.values = array('f')
+        self.frames = 0
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def record(self, kind, tick, x, y, value=0.0):
+        self.kinds.append(EVENT_CODES[kind])
+        self.ticks.append(tick)
+        self.x.append(x)
+        self.y.append(y)
+        self.values.append(value)
+
+    def record_events(self, events, tick):
+        # events: what Simulation.step() returned.
+        for event, x, y in events:
+            self.record(event, tick, x, y)
+
+    def frame(self, tick, x, y, milliseconds):
+        if self.frames % FRAME_SAMPLE_INTERVAL == 0:
+            self.record(FRAME, tick, x, y, milliseconds)
+        self.frames += 1
+
+    def copy(self):
+        # A frozen copy to hand to another thread (the SaveWriter) while
+        # this one keeps recording.
+        run = RunTelemetry()
+        for name, typecode in COLUMNS:
+            setattr(run, name, array(typecode, getattr(self, name)))
+        run.frames = self.frames
+        return run
+
+    def to_bytes(self):
+        # Ticks never go down within a run, so they are stored as deltas.
+        deltas = array('I', np.diff(np.frombuffer(self.ticks, dtype=np.uint32), prepend=np.uint32(0)))
+        columns = {'kinds': self.kinds, 'ticks': deltas, 'x': self.x, 'y': self.y, 'values': self.values}
+        payload = b"".join(columns[name].tobytes() for name, _ in COLUMNS)
+        return TELEMETRY_HEADER.pack(TELEMETRY_MAGIC, TELEMETRY_VERSION, len(self)) + zlib.compress(payload)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) < TELEMETRY_HEADER.size:
+            raise TelemetryError("данные телеметрии слишком короткие")
+        magic, version, count = TELEMETRY_HEADER.unpack_from(data)
+        if magic != TELEMETRY_MAGIC or version != TELEMETRY_VERSION:
+            raise TelemetryError("неизвестный формат телеметрии")
+        try:
+            payload = zlib.decompress(data[TELEMETRY_HEADER.size:])
+        except zlib.error as e:
+            raise TelemetryError(f"телеметрия повреждена: {e}") from e
+
+        run = cls()
+        offset = 0
+        for name, typecode in COLUMNS:
+            column = array(typecode)
+            size = count * column.itemsize
+            column.frombytes(payload[offset:offset + size])
+            if len(column) != count:
+                raise TelemetryError("телеметрия повреждена")
+            setattr(run, name, column)
+            offset += size
+        run.ticks = array('I', np.cumsum(np.frombuffer(run.ticks, dtype=np.uint32), dtype=np.uint32))
+        return run
+
+    def select(self, kind):
+        # (ticks, x, y, values) of one kind of event, as NumPy arrays.
+        mask = np.frombuffer(self.kinds, dtype=np.uint8) == EVENT_CODES[kind]
+        return tuple(np.frombuffer(column, dtype=column.typecode)[mask]
+                     for column in (self.ticks, self.x, self.y, self.values))
+
+
+def iter_runs(db, level=None):
+    # Decoded runs from the database one at a time, as (result id, level,
+    # RunTelemetry); only one page of blobs is in memory at once.
+    for result_id, run_level, data in db.iter_run_events(level):
+        yield result_id, run_level, RunTelemetry.from_bytes(data)
+
+
+def heatmap(runs, kind, cell_size=HEATMAP_CELL):
+    # Streams over runs (RunTelemetry objects, e.g. from iter_runs) and
+    # counts events of one kind per cell_size x cell_size square of the
+    # level. Returns {(cell x, cell y): [count, sum of values]}: for FRAME
+    # the count is time spent there and the sum over it the mean frame time.
+    cells = {}
+    for run in runs:
+        _, x, y, values = run.select(kind)
+        if not len(x):
+            continue
+        keys = np.stack([np.floor_divide(x, cell_size), np.floor_divide(y, cell_size)], axis=1).astype(np.int64)
+        unique, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+        sums = np.bincount(inverse.ravel(), weights=values, minlength=len(unique))
+        for (cx, cy), count, total in zip(unique.tolist(), counts.tolist(), sums.tolist()):
+            cell = cells.setdefault((cx, cy), [0, 0.0])
+            cell[0] += count
+            cell[1] += total
+    return cells
+
+
+def main():
+    from database import GameDatabase
+
+    parser = argparse.ArgumentParser(description="Event heatmaps from recorded level runs")
+    parser.add_argument("--db", default="game_save.db")
+    parser.add_argument("--level", type=int)
+    parser.add_argument("--event", choices=EVENT_KINDS, default=DEATH)
+    parser.add_argument("--cell", type=int, default=HEATMAP_CELL)
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    with GameDatabase(args.db) as db:
+        runs = (run for _, _, run in iter_runs(db, args.level))
+        cells = heatmap(runs, args.event, args.cell)
+    print(f"{args.event}: {sum(count for count, _ in cells.values())} events in {len(cells)} cells")
+    for (cx, cy), (count, total) in sorted(cells.items(), key=lambda item: -item[1][0])[:args.top]:
+        line = f"x {cx * args.cell:>7} y {cy * args.cell:>6}: {count}"
+        if args.event == FRAME:
+            line += f", {total / count:.2f} ms per frame"
+        elif args.event == QUALITY:
+            line += f", mean level {total / count:.1f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
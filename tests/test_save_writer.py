@@ -0,0 +1,105 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from database import GameDatabase, SaveWriter
+
+TIMEOUT = 5.0
+
+
+class GatedDatabase(GameDatabase):
+    # Records every batch the SaveWriter hands over, and can hold the worker
+    # inside run_batch until the test lets it go.
+    def __init__(self, db_name):
+        super().__init__(db_name)
+        self.batches = []
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def run_batch(self, operations):
+        self.batches.append([(name, args) for name, args, kwargs in operations])
+        self.entered.set()
+        self.gate.wait(TIMEOUT)
+        super().run_batch(operations)
+
+
+class SaveWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = GatedDatabase(os.path.join(self.tmp.name, "saves.db"))
+        self.writer = SaveWriter(self.db, max_batch=4)
+
+    def tearDown(self):
+        self.db.gate.set()
+        self.writer.close(TIMEOUT)
+        self.db.close()
+        self.tmp.cleanup()
+
+    def hold_worker(self):
+        # Parks the worker on a first save, so the next ones pile up in the
+        # queue.
+        self.db.gate.clear()
+        self.writer.save_game("первый", 1, 0, 0, 3)
+        self.assertTrue(self.db.entered.wait(TIMEOUT))
+
+    def test_queued_saves_are_written_in_batches(self):
+        self.hold_worker()
+        for level in range(10):
+            self.writer.save_game("Игрок", level, 0, 0, 3)
+        self.db.gate.set()
+        self.assertTrue(self.writer.flush(TIMEOUT))
+
+        self.assertEqual([len(batch) for batch in self.db.batches], [1, 4, 4, 2])
+        self.assertEqual(self.db.load_game("Игрок")['level'], 9)
+
+    def test_saves_of_each_player_keep_their_order(self):
+        for level in range(1, 21):
+            self.writer.save_game("Аня", level, level, 10 * level, 3)
+            self.writer.save_snapshot("Боря", level, bytes([level]))
+        self.assertTrue(self.writer.flush(TIMEOUT))
+
+        written = [(name, args[0], args[1]) for batch in self.db.batches for name, args in batch]
+        for player, name in (("Аня", 'save_game'), ("Боря", 'save_snapshot')):
+            levels = [level for op, who, level in written if who == player]
+            self.assertEqual(levels, list(range(1, 21)))
+            self.assertTrue(all(op == name for op, who, level in written if who == player))
+        self.assertEqual(self.db.load_game("Аня")['level'], 20)
+        self.assertEqual(self.db.load_snapshot("Боря"), {'level': 20, 'data': bytes([20])})
+
+    def test_failed_batch_is_retried_one_save_at_a_time(self):
+        self.hold_worker()
+        self.writer.save_game("Аня", 2, 0, 0, 3)
+        # sqlite cannot bind an arbitrary object: this save fails.
+        self.writer.save_snapshot("Боря", 2, object())
+        self.writer.save_game("Вера", 3, 0, 0, 3)
+        self.db.gate.set()
+        self.assertTrue(self.writer.flush(TIMEOUT))
+
+        self.assertEqual([len(batch) for batch in self.db.batches], [1, 3, 1, 1, 1])
+        self.assertEqual([name for name, error in self.writer.failed], ['save_snapshot'])
+        self.assertEqual(self.db.load_game("Аня")['level'], 2)
+        self.assertEqual(self.db.load_game("Вера")['level'], 3)
+        self.assertIsNone(self.db.load_snapshot("Боря"))
+
+    def test_close_writes_out_queued_saves(self):
+        self.hold_worker()
+        for level in range(10):
+            self.writer.save_game("Игрок", level, 0, 0, 3)
+        threading.Timer(0.05, self.db.gate.set).start()
+        self.writer.close(TIMEOUT)
+
+        self.assertFalse(self.writer.worker.is_alive())
+        self.assertEqual(self.writer.pending, 0)
+        self.assertEqual(self.db.load_game("Игрок")['level'], 9)
+
+    def test_saves_after_close_are_rejected(self):
+        self.writer.close(TIMEOUT)
+        with self.assertRaises(RuntimeError):
+            self.writer.save_game("Игрок", 1, 0, 0, 3)
+        self.assertEqual(self.writer.pending, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import threading
+
+import arcade
+
+
+PLAYER_TEXTURE = "assets/tagilla.png"
+RUBLES_TEXTURE = "assets/rubles.png"
+PMC_TEXTURE = "assets/pmc.png"
+PLATFORM_TEXTURE = "assets/block.png"
+FLAG_TEXTURES = tuple(f"assets/flag/flag{i}.png" for i in range(3))
+
+
+class TextureCache:
+    # Decodes every PNG once per process and hands the same arcade.Texture
+    # to every sprite that asks for it. Safe to use from several threads:
+    # a texture still being decoded elsewhere is waited for, not decoded twice.
+    def __init__(self):
+        self.textures = {}
+        self.loads = 0
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        texture = self.textures.get(path)
+        if texture is None:
+            with self.lock:
+                texture = self.textures.get(path)
+                if texture is None:
+                    texture = arcade.load_texture(path)
+                    self.textures[path] = texture
+                    self.loads += 1
+        return texture
+
+    def frames(self, paths):
+        return tuple(self.get(path) for path in paths)
+
+    def all_paths(self):
+        return (PLAYER_TEXTURE, RUBLES_TEXTURE, PMC_TEXTURE, PLATFORM_TEXTURE) + FLAG_TEXTURES
+
+    def preload(self, atlas=None):
+        # Packing into the window's default atlas up front means the first
+        # SpriteList draw of a level does not have to upload anything.
+        for path in self.all_paths():
+            texture = self.get(path)
+            if atlas is not None:
+                atlas.add(texture)
+
+
+TEXTURES = TextureCache()
@@ -0,0 +1,40 @@
+SIMULATION_STEP = 1 / 60
+MAX_CATCH_UP_STEPS = 5
+
+
+class FixedTimestep:
+    # Accumulates real frame time and hands out whole simulation ticks of a
+    # fixed length. What is left over becomes `alpha`, the fraction of a tick
+    # to interpolate by when drawing. After a long stall at most
+    # max_steps ticks are run and the rest of the backlog is dropped, so a
+    # slow frame cannot snowball into ever longer catch-up frames.
+    def __init__(self, step=SIMULATION_STEP, max_steps=MAX_CATCH_UP_STEPS):
+        self.step = step
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        self.ticks = 0
+        self.dropped_time = 0.0
+
+    def advance(self, delta_time):
+        self.accumulator += delta_time
+        # The epsilon keeps float drift (e.g. 144 x 1/144) from losing a tick.
+        steps = int(self.accumulator / self.step + 1e-6)
+        if steps > self.max_steps:
+            self.dropped_time += (steps - self.max_steps) * self.step
+            self.accumulator -= (steps - self.max_steps) * self.step
+            steps = self.max_steps
+        self.accumulator -= steps * self.step
+        self.ticks += steps
+        return steps
+
+    @property
+    def alpha(self):
+        return min(max(self.accumulator / self.step, 0.0), 1.0)
+
+    def reset(self):
+        self.accumulator = 0.0
+
+
+def lerp_xy(previous, current, alpha):
+    return (previous[0] + (current[0] - previous[0]) * alpha,
+            previous[1] + (current[1] - previous[1]) * alpha)